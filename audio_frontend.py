@@ -0,0 +1,313 @@
+import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import sounddevice as sd
+from vosk import KaldiRecognizer
+
+from tracing import tracer
+
+WAKE_PHRASES = ("hey aura", "aura")
+GRAMMAR_MIN_CONFIDENCE = 0.6    # mean word confidence below which a grammar result is re-decoded
+
+
+def is_speech(block, threshold):
+    rms = np.sqrt(np.mean(block.astype(np.float32) ** 2))
+    return rms >= threshold
+
+
+def vocabulary_grammar(phrases, extra_words=()):
+    """Vosk grammar (a JSON list) of `phrases`, each of their words, `extra_words` and [unk].
+
+    Vosk lets grammar entries follow one another, so the single words keep
+    reworded questions decodable while the whole phrases favour the known
+    ones; anything else comes out as [unk].
+    """
+    words = sorted({w for p in phrases for w in p.split()} | set(extra_words))
+    return json.dumps(list(phrases) + words + ["[unk]"])
+
+
+def uncertain(text, confidences, min_confidence=GRAMMAR_MIN_CONFIDENCE):
+    """Whether a grammar result should be decoded again without the grammar."""
+    if not text or "[unk]" in text.split():
+        return True     # words outside the vocabulary were spoken
+    return bool(confidences) and sum(confidences) / len(confidences) < min_confidence
+
+
+def _collect(result, pieces, confidences):
+    text = result.get("text", "")
+    if text:
+        pieces.append(text)
+    confidences.extend(w["conf"] for w in result.get("result", []))
+
+
+class AudioFrontEnd:
+    """Keeps one input stream open and serves utterances out of a ring buffer.
+
+    The PortAudio callback only copies samples into the ring, so the device is
+    opened once per session. Each listen() starts reading `pre_roll` seconds
+    in the past, which keeps the first syllable that arrived before the call.
+    """
+
+    def __init__(self, vosk_model, sample_rate=16000, block_size=1600,
+                 ring_seconds=10.0, pre_roll=0.3, pool_size=2, device=None):
+        self.vosk_model = vosk_model
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.pre_roll = pre_roll
+        self.device = device
+
+        self._ring = np.zeros(int(ring_seconds * sample_rate), dtype=np.int16)
+        self._written = 0           # total samples ever written
+        self._cond = threading.Condition()
+        self._stream = None
+
+        # Recognizers are expensive to build; hand them out and Reset() on return
+        self._pool = queue.LifoQueue()
+        self._pool_size = pool_size
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        self._wake_rec = None
+        self._grammar = None
+        self._grammar_rec = None
+        self._grammar_lock = threading.Lock()
+
+    # ---------- stream ----------
+    def start(self):
+        if self._stream is not None:
+            return
+        self._stream = sd.InputStream(samplerate=self.sample_rate, blocksize=self.block_size,
+                                      channels=1, dtype='int16', device=self.device,
+                                      callback=self._callback)
+        self._stream.start()
+
+    def stop(self):
+        if self._stream is None:
+            return
+        self._stream.stop()
+        self._stream.close()
+        self._stream = None
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def running(self):
+        return self._stream is not None
+
+    def _callback(self, indata, frames, time_info, status):
+        samples = indata[:, 0]
+        size = len(self._ring)
+        with self._cond:
+            start = self._written % size
+            end = start + len(samples)
+            if end <= size:
+                self._ring[start:end] = samples
+            else:
+                split = size - start
+                self._ring[start:] = samples[:split]
+                self._ring[:end - size] = samples[split:]
+            self._written += len(samples)
+            self._cond.notify_all()
+
+    def position(self):
+        with self._cond:
+            return self._written
+
+    def read(self, pos, timeout=1.0):
+        """Return (samples, new_pos) for everything written since `pos`."""
+        size = len(self._ring)
+        with self._cond:
+            if self._written <= pos:
+                self._cond.wait_for(lambda: self._written > pos or self._stream is None, timeout)
+            written = self._written
+            if written <= pos:
+                return None, pos
+            # A reader that fell more than a ring behind loses the oldest audio
+            pos = max(pos, written - size)
+            start, end = pos % size, written % size
+            if start < end:
+                samples = self._ring[start:end].copy()
+            else:
+                samples = np.concatenate((self._ring[start:], self._ring[:end]))
+        return samples, written
+
+    # ---------- recognizers ----------
+    @contextmanager
+    def recognizer(self):
+        rec = None
+        try:
+            rec = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                if self._created < self._pool_size:
+                    self._created += 1
+                    rec = KaldiRecognizer(self.vosk_model, self.sample_rate)
+        if rec is None:
+            rec = self._pool.get()
+        try:
+            yield rec
+        finally:
+            rec.Reset()
+            self._pool.put(rec)
+
+    @contextmanager
+    def grammar_recognizer(self, grammar):
+        """A recognizer restricted to `grammar`, rebuilt only when the grammar changes."""
+        with self._grammar_lock:
+            if grammar != self._grammar:
+                self._grammar_rec = KaldiRecognizer(self.vosk_model, self.sample_rate, grammar)
+                self._grammar_rec.SetWords(True)    # per-word confidences for uncertain()
+                self._grammar = grammar
+            try:
+                yield self._grammar_rec
+            finally:
+                self._grammar_rec.Reset()
+
+    def transcribe(self, samples, grammar=None, min_confidence=GRAMMAR_MIN_CONFIDENCE):
+        """(text, fell back) for int16 `samples`, without the microphone.
+
+        With a grammar, an uncertain result is decoded again with the full
+        vocabulary, as listen() does.
+        """
+        pieces, confidences = [], []
+        with (self.grammar_recognizer(grammar) if grammar else self.recognizer()) as rec:
+            for i in range(0, len(samples), self.block_size):
+                if rec.AcceptWaveform(samples[i:i + self.block_size].tobytes()):
+                    _collect(json.loads(rec.Result()), pieces, confidences)
+            _collect(json.loads(rec.FinalResult()), pieces, confidences)
+        text = " ".join(pieces)
+        if grammar and uncertain(text, confidences, min_confidence):
+            return self.transcribe(samples)[0], True
+        return text, False
+
+    # ---------- wake word ----------
+    def wait_for_wake_word(self, phrases=WAKE_PHRASES, timeout=1.0, energy_threshold=500,
+                           chunk_seconds=0.3, hangover=0.6):
+        """True once one of `phrases` is heard, False after `timeout` seconds without it.
+
+        Runs a grammar-restricted recognizer that can only return the wake
+        phrases or [unk], and only feeds it while the energy gate is open
+        (voiced audio plus `hangover` seconds after it), so the idle cost is
+        an RMS per block. Call it in a loop; the decoder state carries over
+        between calls.
+        """
+        self.start()
+        if self._wake_rec is None:
+            grammar = json.dumps(list(phrases) + ["[unk]"])
+            self._wake_rec = KaldiRecognizer(self.vosk_model, self.sample_rate, grammar)
+            self._wake_pos = self.position()
+            self._wake_open = 0.0
+            self._wake_previous = None
+        rec = self._wake_rec
+        if self.position() - self._wake_pos > self.sample_rate:
+            # Not called for a while (a query was being listened to); skip that audio
+            rec.Reset()
+            self._wake_pos = self.position()
+            self._wake_open = 0.0
+            self._wake_previous = None
+        chunk = int(chunk_seconds * self.sample_rate)
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            with self._cond:
+                self._cond.wait_for(lambda: self._written - self._wake_pos >= chunk or self._stream is None,
+                                    max(0.0, deadline - time.monotonic()))
+                if self._stream is None:
+                    return False
+                if self._written - self._wake_pos < chunk:
+                    continue
+            samples, self._wake_pos = self.read(self._wake_pos)
+
+            voiced = any(is_speech(samples[i:i + self.block_size], energy_threshold)
+                         for i in range(0, len(samples), self.block_size))
+            previous, self._wake_previous = self._wake_previous, samples
+            if voiced:
+                if self._wake_open <= 0 and previous is not None:
+                    # Gate just opened: the chunk before holds the onset
+                    rec.AcceptWaveform(previous.tobytes())
+                self._wake_open = hangover
+            elif self._wake_open > 0:
+                self._wake_open -= len(samples) / self.sample_rate
+                if self._wake_open <= 0:
+                    rec.Reset()     # gate closed: start the next phrase clean
+            if self._wake_open <= 0:
+                continue
+
+            if rec.AcceptWaveform(samples.tobytes()):
+                text = json.loads(rec.Result()).get("text", "")
+            else:
+                text = json.loads(rec.PartialResult()).get("partial", "")
+            if any(phrase in text for phrase in phrases):
+                rec.Reset()
+                self._wake_open = 0.0
+                return True
+        return False
+
+    # ---------- utterances ----------
+    def listen(self, on_partial=None, start_timeout=5.0, silence_timeout=0.8,
+               max_duration=10.0, energy_threshold=500, grammar=None,
+               min_confidence=GRAMMAR_MIN_CONFIDENCE):
+        """Decode one utterance; with `grammar`, fall back to the full vocabulary when uncertain."""
+        self.start()
+        block_seconds = self.block_size / self.sample_rate
+        pieces = []
+        confidences = []
+        heard = []          # the utterance's audio, kept for a full-vocabulary retry
+        last_partial = ""
+        heard_speech = False
+        silence = 0.0
+        elapsed = 0.0
+        decode_seconds = 0.0
+        pos = max(0, self.position() - int(self.pre_roll * self.sample_rate))
+
+        with (self.grammar_recognizer(grammar) if grammar else self.recognizer()) as rec:
+            while elapsed < max_duration:
+                samples, pos = self.read(pos)
+                if samples is None:
+                    break
+                elapsed += len(samples) / self.sample_rate
+                if grammar:
+                    heard.append(samples)
+
+                for i in range(0, len(samples), self.block_size):
+                    block = samples[i:i + self.block_size]
+                    if is_speech(block, energy_threshold):
+                        heard_speech = True
+                        silence = 0.0
+                    else:
+                        silence += block_seconds
+
+                t = time.perf_counter()
+                endpoint = rec.AcceptWaveform(samples.tobytes())
+                decode_seconds += time.perf_counter() - t
+                if endpoint:
+                    # Vosk hit an endpoint of its own
+                    count = len(pieces)
+                    _collect(json.loads(rec.Result()), pieces, confidences)
+                    if len(pieces) > count and heard_speech:
+                        break
+                else:
+                    partial = json.loads(rec.PartialResult()).get("partial", "")
+                    if partial and partial != last_partial:
+                        last_partial = partial
+                        if on_partial:
+                            on_partial(" ".join(pieces + [partial]))
+
+                if not heard_speech and elapsed >= start_timeout:
+                    break
+                if heard_speech and silence >= silence_timeout:
+                    break
+
+            with tracer.span("asr.final"):
+                _collect(json.loads(rec.FinalResult()), pieces, confidences)
+        # Decoding is interleaved with recording, so report its total separately
+        end = time.perf_counter()
+        tracer.record("asr.decode", end - decode_seconds, end, audio_seconds=round(elapsed, 2))
+        text = " ".join(pieces)
+        if grammar and heard_speech and uncertain(text, confidences, min_confidence):
+            with tracer.span("asr.fallback"):
+                text, _ = self.transcribe(np.concatenate(heard))
+        return text
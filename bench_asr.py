@@ -0,0 +1,116 @@
+"""Compare full-vocabulary and FAQ-grammar Vosk decoding on recorded WAVs.
+
+Each <name>.wav (16 kHz mono, 16-bit) needs a <name>.txt next to it with
+what was said. Both modes decode the same audio without the microphone;
+the faq mode falls back to the full vocabulary on uncertain results, as
+listen() does, and the fallback share is reported with its cost included.
+
+    python bench_asr.py recordings/
+    python bench_asr.py recordings/ --min-confidence 0.5 --json asr.json
+"""
+import argparse
+import json
+import sys
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+from vosk import Model, SetLogLevel
+
+from audio_frontend import AudioFrontEnd, GRAMMAR_MIN_CONFIDENCE
+
+MODES = ("full", "faq")
+
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance (substitutions + insertions + deletions)."""
+    ref, hyp = reference.split(), hypothesis.split()
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1]
+
+
+def load_recordings(folder, sample_rate):
+    recordings = []
+    for wav in sorted(Path(folder).glob("*.wav")):
+        transcript = wav.with_suffix(".txt")
+        if not transcript.exists():
+            print(f"  skipping {wav.name}: no {transcript.name}")
+            continue
+        with wave.open(str(wav), "rb") as wf:
+            if (wf.getframerate(), wf.getnchannels(), wf.getsampwidth()) != (sample_rate, 1, 2):
+                print(f"  skipping {wav.name}: not {sample_rate} Hz mono 16-bit")
+                continue
+            samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        recordings.append((wav.name, samples, transcript.read_text(encoding="utf-8")))
+    return recordings
+
+
+def run_mode(frontend, recordings, grammar, min_confidence, clean):
+    errors = words = fallbacks = 0
+    latencies, audio_seconds, rows = [], 0.0, []
+    for name, samples, reference in recordings:
+        start = time.perf_counter()
+        text, fell_back = frontend.transcribe(samples, grammar, min_confidence)
+        latencies.append(time.perf_counter() - start)
+        audio_seconds += len(samples) / frontend.sample_rate
+        reference = clean(reference)
+        errors += word_errors(reference, clean(text))
+        words += len(reference.split())
+        fallbacks += fell_back
+        rows.append({"file": name, "text": text, "fallback": fell_back})
+    ms = np.array(latencies) * 1000
+    return {
+        "wer": round(errors / max(words, 1), 4),
+        "latency_p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "latency_p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "real_time_factor": round(sum(latencies) / audio_seconds, 4),
+        "fallback_rate": round(fallbacks / len(recordings), 4),
+        "files": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs FAQ-grammar speech recognition.")
+    parser.add_argument("folder", help="directory of <name>.wav + <name>.txt pairs")
+    parser.add_argument("--model", default="vosk_model_in", help="Vosk model directory")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--min-confidence", type=float, default=GRAMMAR_MIN_CONFIDENCE,
+                        help="faq mode falls back below this mean word confidence")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    # The FAQ and its normalization live in queries.py (which also loads the encoder)
+    from queries import faq_grammar, clean, SAMPLE_RATE
+
+    SetLogLevel(-1)
+    frontend = AudioFrontEnd(Model(args.model), sample_rate=SAMPLE_RATE)
+    recordings = load_recordings(args.folder, SAMPLE_RATE)
+    if not recordings:
+        print(f"No usable recordings in {args.folder}.")
+        sys.exit(1)
+    grammar = faq_grammar()
+    print(f"{len(recordings)} recordings, FAQ grammar of {len(json.loads(grammar)) - 1} entries\n")
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = run_mode(frontend, recordings, grammar if mode == "faq" else None,
+                                 args.min_confidence, clean)
+
+    print(f"{'mode':<6}{'WER':>8}{'p50 ms':>9}{'p95 ms':>9}{'RTF':>8}{'fallback':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<6}{r['wer']:>8.1%}{r['latency_p50_ms']:>9.1f}{r['latency_p95_ms']:>9.1f}"
+              f"{r['real_time_factor']:>8.3f}{r['fallback_rate']:>10.0%}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Compare sentence-encoder backends for queries.py.
+
+Each backend runs in its own subprocess so start-up time and RSS are not
+polluted by the others. Answer agreement is measured against the first
+backend listed (torch by default).
+
+    python bench_encoder.py
+    python bench_encoder.py --backends torch onnx onnx-int8 --questions logged_questions.tsv
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+SAMPLE_QUESTIONS = [
+    "who is the principal of this school",
+    "which teacher takes science",
+    "where can i find class 8a",
+    "when does school start and end",
+    "where is the library",
+    "who is our maths teacher",
+    "how many class rooms does the school have",
+    "where is the principals office",
+    "what is for lunch today",
+    "is there a swimming pool",
+]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def worker(backend, questions, repeats):
+    os.environ["AURA_ENCODER"] = backend
+    start = time.perf_counter()
+    import queries
+    load_seconds = time.perf_counter() - start
+
+    single = []
+    for _ in range(repeats):
+        for q in questions:
+            t = time.perf_counter()
+            queries.encoder.encode([q])
+            single.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    queries.encoder.encode(questions)
+    batch_seconds = time.perf_counter() - t
+
+    chosen = queries.choose_indices(queries.score_queries(questions))
+    single_ms = np.array(single) * 1000
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "encode_p50_ms": float(np.percentile(single_ms, 50)),
+        "encode_p95_ms": float(np.percentile(single_ms, 95)),
+        "batch_per_query_ms": batch_seconds * 1000 / len(questions),
+        "peak_rss_mb": peak_rss_mb(),
+        "torch_imported": "torch" in sys.modules,
+        "chosen": [int(c) for c in chosen],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sentence-encoder backends.")
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"])
+    parser.add_argument("--questions", help="question file in the evaluate.py format")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.questions:
+        from evaluate import load_questions
+        questions, _ = load_questions(args.questions)
+    else:
+        questions = SAMPLE_QUESTIONS
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, questions, args.repeats)))
+        return
+
+    results = []
+    for backend in args.backends:
+        cmd = [sys.executable, __file__, "--worker", backend, "--repeats", str(args.repeats)]
+        if args.questions:
+            cmd += ["--questions", args.questions]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{backend}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        return
+    reference = results[0]["chosen"]
+    print(f"\n{'backend':<12}{'load s':>8}{'p50 ms':>9}{'p95 ms':>9}{'batch ms/q':>12}{'RSS MB':>9}{'agree':>8}")
+    for r in results:
+        agree = sum(a == b for a, b in zip(r["chosen"], reference)) / len(reference)
+        print(f"{r['backend']:<12}{r['load_seconds']:>8.2f}{r['encode_p50_ms']:>9.2f}{r['encode_p95_ms']:>9.2f}"
+              f"{r['batch_per_query_ms']:>12.2f}{r['peak_rss_mb']:>9.0f}{agree:>8.1%}")
+    print(f"\nAgreement is measured against {results[0]['backend']} over {len(reference)} questions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Offline benchmark for the detection and recognition path used by recognise.py.
+
+Replays a video file or a directory of frames through the same detector,
+preprocessing and LBPH/KNN recognizers, with no camera or window. A
+labelled directory (<person>/<image>) gives identification accuracy, and
+--synthetic builds galleries of N fake people to show how matching cost
+scales. Results are tagged with the git commit so runs can be compared.
+
+    python bench_recognition.py --video hallway.mp4 --labelled testset/ --json bench.json
+    python bench_recognition.py --synthetic 10 50 100 --backends knn lbph lbp lbp-hellinger
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from face_pipeline import (BASE_DIR, dataset_path, load_detector, detect_faces,
+                           load_gallery, load_backend_gallery, FaceRecognizer, Gallery,
+                           calibrate, BACKENDS)
+from frame_metrics import FrameMetrics
+from lbp import LBP_BACKENDS, histogram_gallery
+from frame_source import FrameSource, IMAGE_EXTENSIONS
+from preprocess import FACE_SIZE, load_preprocessor
+
+KEEP_ALL = 10 ** 7     # FrameMetrics window large enough to keep every sample
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except ImportError:
+        return None
+
+
+def iter_frames(source, limit=None):
+    with FrameSource(source, fourcc=None, buffer_size=None) as frames:
+        for count, frame in enumerate(frames):
+            if limit is not None and count >= limit:
+                break
+            yield frame
+
+
+def stage_summary(metrics):
+    out = {}
+    for name in metrics.stages:
+        p50, p95 = metrics.percentiles(name)
+        out[name] = {"p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "count": len(metrics.stages[name])}
+    return out
+
+
+def run_replay(net, recognizer, preprocess, frames):
+    metrics = FrameMetrics(source="replay", window=KEEP_ALL)
+    faces_seen = 0
+    start = time.perf_counter()
+    for frame in frames:
+        with metrics.stage("detect"):
+            faces = detect_faces(net, frame)
+        for x1, y1, x2, y2, _ in faces:
+            with metrics.stage("preprocess"):
+                face = recognizer.prepare(frame[y1:y2, x1:x2], preprocess)
+            with metrics.stage("recognize"):
+                recognizer.predict(face)
+            faces_seen += 1
+        metrics.frame_done()
+    elapsed = time.perf_counter() - start
+    return {
+        "frames": metrics.frames,
+        "faces": faces_seen,
+        "seconds": round(elapsed, 3),
+        "fps": round(metrics.frames / elapsed, 2) if elapsed else None,
+        "stages": stage_summary(metrics),
+    }
+
+
+def run_labelled(net, recognizer, preprocess, root):
+    # Each image is either a full frame (the largest detection is used) or an
+    # already-cropped face when nothing is detected in it.
+    metrics = FrameMetrics(source="labelled", window=KEEP_ALL)
+    total = correct = unknown = 0
+    for person_dir in sorted(p for p in Path(root).iterdir() if p.is_dir()):
+        for path in sorted(person_dir.iterdir()):
+            if path.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            image = cv2.imread(str(path))
+            if image is None:
+                continue
+            with metrics.stage("detect"):
+                faces = detect_faces(net, image)
+            if faces:
+                x1, y1, x2, y2, _ = max(faces, key=lambda f: (f[2] - f[0]) * (f[3] - f[1]))
+                image = image[y1:y2, x1:x2]
+            with metrics.stage("preprocess"):
+                face = recognizer.prepare(image, preprocess)
+            with metrics.stage("recognize"):
+                name = recognizer.predict(face)
+            total += 1
+            correct += name == person_dir.name
+            unknown += name == "Unknown"
+    return {
+        "images": total,
+        "accuracy": round(correct / total, 4) if total else None,
+        "unknown_rate": round(unknown / total, 4) if total else None,
+        "stages": stage_summary(metrics),
+    }
+
+
+def synthetic_gallery(people, samples, seed=0, base=None):
+    # Fake people: a random "identity" image per person plus per-sample
+    # jitter. Starting from real faces keeps the LBP statistics realistic.
+    rng = np.random.default_rng(seed)
+    faces = np.empty((people * samples,) + FACE_SIZE, dtype=np.uint8)
+    for p in range(people):
+        if base is not None and len(base):
+            identity = base[rng.integers(len(base))].astype(np.int16)
+            identity = np.roll(identity, rng.integers(-8, 9, size=2), axis=(0, 1))
+        else:
+            identity = cv2.GaussianBlur(rng.integers(0, 256, FACE_SIZE).astype(np.uint8), (9, 9), 0).astype(np.int16)
+        noise = rng.normal(0, 12, (samples,) + FACE_SIZE)
+        faces[p * samples:(p + 1) * samples] = np.clip(identity + noise, 0, 255).astype(np.uint8)
+    labels = np.repeat(np.arange(people, dtype=np.int32), samples)
+    names = {i: f"synthetic_{i}" for i in range(people)}
+    return Gallery(faces, labels, names)
+
+
+def run_scaling(sizes, samples, backends, probes, base):
+    rows = []
+    rng = np.random.default_rng(1)
+    for people in sizes:
+        gallery = synthetic_gallery(people, samples, base=base)
+        probe_idx = rng.choice(len(gallery), size=min(probes, len(gallery)), replace=False)
+        for backend in backends:
+            start = time.perf_counter()
+            if backend == "embed":
+                from face_embedding import embed_gallery
+                matched = embed_gallery(gallery)
+            elif backend in LBP_BACKENDS:
+                matched = histogram_gallery(gallery, backend)
+            else:
+                matched = gallery
+            recognizer = FaceRecognizer(matched, backend=backend)
+            build = time.perf_counter() - start
+            times = []
+            correct = 0
+            for i in probe_idx:
+                t = time.perf_counter()
+                name = recognizer.predict(gallery.faces[i])
+                times.append((time.perf_counter() - t) * 1000)
+                correct += name == gallery.names[int(gallery.labels[i])]
+            # All probes in one call, as a frame with many faces would be
+            t = time.perf_counter()
+            recognizer.identify_batch(list(gallery.faces[probe_idx]))
+            batch_ms = (time.perf_counter() - t) * 1000 / len(probe_idx)
+            rows.append({
+                "backend": backend,
+                "people": people,
+                "samples": len(gallery),
+                "gallery_mb": round(matched.faces.nbytes / 2 ** 20, 2),
+                "build_s": round(build, 3),
+                "predict_p50_ms": round(float(np.percentile(times, 50)), 3),
+                "predict_p95_ms": round(float(np.percentile(times, 95)), 3),
+                "batch_ms_per_face": round(batch_ms, 3),
+                "self_accuracy": round(correct / len(probe_idx), 4),
+            })
+            print(f"  {backend:<5} people={people:<5} samples={len(gallery):<7} gallery={rows[-1]['gallery_mb']} MB "
+                  f"p50={rows[-1]['predict_p50_ms']:.2f} ms  p95={rows[-1]['predict_p95_ms']:.2f} ms  "
+                  f"batched={batch_ms:.2f} ms/face")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detection and recognition without a camera.")
+    parser.add_argument("--video", help="video file to replay")
+    parser.add_argument("--frames", help="directory of frames to replay")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--labelled", help="directory of <person>/<image> for accuracy")
+    parser.add_argument("--gallery", default=str(dataset_path), help="enrolled .npy faces (default: data/)")
+    parser.add_argument("--backends", nargs="+", default=["lbph", "knn"], choices=BACKENDS)
+    parser.add_argument("--far", type=float,
+                        help="calibrate unknown rejection at this false-accept target (default: fixed LBPH threshold)")
+    parser.add_argument("--synthetic", type=int, nargs="*", metavar="PEOPLE",
+                        help="also time matching against synthetic galleries of these sizes")
+    parser.add_argument("--samples", type=int, default=200, help="samples per synthetic person")
+    parser.add_argument("--probes", type=int, default=50, help="faces matched per synthetic gallery")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    results = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "backends": {},
+    }
+
+    net = load_detector()
+    preprocess = load_preprocessor(args.gallery)
+    gallery = load_gallery(args.gallery, verbose=False)
+    if gallery is None and (args.video or args.frames or args.labelled):
+        print(f"No enrolled faces in {args.gallery}; replay and accuracy runs need a gallery.")
+        sys.exit(1)
+
+    if gallery is not None:
+        for backend in args.backends:
+            print(f"\n[{backend}] gallery of {len(gallery)} samples, {len(gallery.names)} people")
+            start = time.perf_counter()
+            matched = gallery if backend in ("lbph", "knn") else load_backend_gallery(args.gallery, backend, verbose=False)
+            recognizer = FaceRecognizer(matched, backend=backend)
+            if args.far is not None:
+                recognizer.set_calibration(calibrate(recognizer), args.far)
+            entry = {"build_s": round(time.perf_counter() - start, 3),
+                     "gallery_mb": round(matched.faces.nbytes / 2 ** 20, 2)}
+            if args.video or args.frames:
+                entry["replay"] = run_replay(net, recognizer, preprocess, iter_frames(args.video or args.frames, args.max_frames))
+                r = entry["replay"]
+                print(f"  replay: {r['frames']} frames, {r['faces']} faces, {r['fps']} FPS")
+                for name, s in r["stages"].items():
+                    print(f"    {name:<10} p50 {s['p50_ms']:8.2f} ms  p95 {s['p95_ms']:8.2f} ms")
+            if args.labelled:
+                entry["labelled"] = run_labelled(net, recognizer, preprocess, args.labelled)
+                print(f"  accuracy: {entry['labelled']['accuracy']} over {entry['labelled']['images']} images, "
+                      f"{entry['labelled']['unknown_rate']} rejected as unknown")
+            results["backends"][backend] = entry
+
+    if args.synthetic:
+        print("\nSynthetic gallery scaling:")
+        base = gallery.faces if gallery is not None else None
+        results["scaling"] = run_scaling(args.synthetic, args.samples, args.backends, args.probes, base)
+
+    _, peak = tracemalloc.get_traced_memory()
+    results["peak_python_mb"] = round(peak / 2 ** 20, 2)
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(f"\nPeak memory: {results['peak_python_mb']} MB traced, {results['peak_rss_mb']} MB RSS")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
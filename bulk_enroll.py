@@ -0,0 +1,330 @@
+"""Enroll many people at once from photo folders and videos.
+
+    python bulk_enroll.py roster/              # roster/<person>/*.jpg|*.mp4, roster/<person>.mp4
+    python bulk_enroll.py roster/ --workers 8 --mode append
+
+Detection and preprocessing run on a process pool, one file per task. Each
+finished file is saved under data/.bulk/ and logged to a journal, and a
+person is written to the gallery (and the catalog) as soon as all their
+files are in. An interrupted run picks up where it stopped when started
+again with the same arguments.
+"""
+import argparse
+import hashlib
+import json
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from face_pipeline import dataset_path, load_detector, detect_faces, load_recognizer
+from face_catalog import FaceCatalog, CatalogError, check_name
+from face_embedding import EMBED_MODEL, FaceEmbedder, save_embeddings, embeddings_file
+from face_workers import available_cores
+from frame_source import IMAGE_EXTENSIONS
+from preprocess import FACE_SIZE, gallery_preprocessor, load_preprocessor
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
+MAX_SAMPLES = 200           # per person, as with train.py
+FRAME_STRIDE = 5            # use every 5th video frame, as train.py does
+MAX_PER_VIDEO = 200
+WORK_DIR = ".bulk"
+JOURNAL = "bulk_journal.jsonl"
+
+# Per-worker state
+_net = None
+_preprocess = None
+_embedder = None
+
+
+def find_work(root):
+    """({person: [files]}, [invalid names]) from <root>/<person>/<file> and <root>/<person>.<video>.
+
+    Names the catalog would refuse (hidden folders such as .ipynb_checkpoints,
+    path separators) are left out and returned separately.
+    """
+    work, invalid = {}, []
+    for entry in sorted(Path(root).iterdir()):
+        if entry.is_dir():
+            name = entry.name
+            files = [p for p in sorted(entry.rglob("*"))
+                     if p.suffix.lower() in IMAGE_EXTENSIONS | VIDEO_EXTENSIONS]
+        elif entry.suffix.lower() in VIDEO_EXTENSIONS:
+            name, files = entry.stem, [entry]
+        else:
+            continue
+        if not files:
+            continue
+        try:
+            name = check_name(name)
+        except CatalogError:
+            invalid.append(entry.name)
+            continue
+        work.setdefault(name, []).extend(files)
+    return work, invalid
+
+
+def file_key(path):
+    # Stable across runs; changes if the file is replaced
+    stat = path.stat()
+    return hashlib.sha1(f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def _init_worker(gallery_path, use_embedder):
+    global _net, _preprocess, _embedder
+    cv2.setNumThreads(1)        # one process per core already
+    _net = load_detector()
+    _preprocess = load_preprocessor(gallery_path)
+    _embedder = FaceEmbedder() if use_embedder else None
+
+
+def _largest_face(image):
+    faces = detect_faces(_net, image)
+    if not faces:
+        return None
+    x1, y1, x2, y2, _ = max(faces, key=lambda f: (f[2] - f[0]) * (f[3] - f[1]))
+    return image[y1:y2, x1:x2]
+
+
+def _frames(path):
+    if path.suffix.lower() in IMAGE_EXTENSIONS:
+        image = cv2.imread(str(path))
+        if image is not None:
+            yield image
+        return
+    cap = cv2.VideoCapture(str(path))
+    index = kept = 0
+    try:
+        while kept < MAX_PER_VIDEO:
+            if not cap.grab():
+                break
+            index += 1
+            if index % FRAME_STRIDE:
+                continue
+            ret, frame = cap.retrieve()
+            if ret:
+                kept += 1
+                yield frame
+    finally:
+        cap.release()
+
+
+def process_file(path):
+    """(faces (n, 128, 128) uint8, embeddings (n, D) or None) for one image or video."""
+    crops = [c for c in (_largest_face(frame) for frame in _frames(path)) if c is not None and c.size]
+    faces = np.empty((len(crops),) + FACE_SIZE, dtype=np.uint8)
+    for i, crop in enumerate(crops):
+        _preprocess(crop, out=faces[i])
+    embeddings = _embedder.embed(crops) if _embedder is not None and crops else None
+    return faces, embeddings
+
+
+class Journal:
+    """Append-only record of finished files and people, for resuming."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.files = {}
+        self.people = set()
+        if self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue        # torn last line from an interrupted run
+                if "file" in entry:
+                    self.files[entry["key"]] = entry
+                elif "person" in entry:
+                    self.people.add(entry["person"])
+        self._out = open(self.path, "a", encoding="utf-8")
+
+    def write(self, entry):
+        self._out.write(json.dumps(entry) + "\n")
+        self._out.flush()
+
+    def close(self):
+        self._out.close()
+
+
+def finish_person(name, parts, mode, max_samples, catalog):
+    """Assemble a person's per-file results into data/<name>.npy and index it."""
+    faces, embeddings = [np.empty((0,) + FACE_SIZE, dtype=np.uint8)], []
+    complete = True     # every face has an embedding
+    for part in parts:
+        with np.load(part) as data:
+            if not len(data["faces"]):
+                continue
+            faces.append(data["faces"])
+            if "embeddings" in data:
+                embeddings.append(data["embeddings"])
+            else:
+                complete = False
+    faces = np.concatenate(faces)
+    embeddings = np.concatenate(embeddings) if embeddings and complete else None
+
+    target = dataset_path / f"{name}.npy"
+    if mode == "append" and target.exists():
+        existing = np.load(target).reshape((-1,) + FACE_SIZE)
+        old_embeddings = embeddings_file(dataset_path, name)
+        if embeddings is not None and old_embeddings.exists():
+            embeddings = np.concatenate([np.load(old_embeddings), embeddings])
+        else:
+            embeddings = None
+        faces = np.concatenate([existing, faces])
+
+    if not len(faces):
+        return 0
+    if len(faces) > max_samples:
+        # Spread the kept samples over every file rather than keep the first ones
+        keep = np.linspace(0, len(faces) - 1, max_samples).astype(int)
+        faces = faces[keep]
+        embeddings = embeddings[keep] if embeddings is not None else None
+
+    np.save(target, faces)
+    if embeddings is not None:
+        save_embeddings(dataset_path, name, embeddings)
+    else:
+        embeddings_file(dataset_path, name).unlink(missing_ok=True)
+    catalog.record(name)
+    return len(faces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll people from photo folders and video files.")
+    parser.add_argument("root", help="directory of <person>/ folders (images, videos) or <person>.<video> files")
+    parser.add_argument("--workers", type=int, default=available_cores(), help="processes (default: all cores)")
+    parser.add_argument("--mode", choices=["skip", "replace", "append"], default="skip",
+                        help="what to do with people already enrolled (default: skip)")
+    parser.add_argument("--max-samples", type=int, default=MAX_SAMPLES, help="samples kept per person")
+    parser.add_argument("--clahe", action="store_true", help="as train.py, first enrollment only")
+    parser.add_argument("--align", action="store_true", help="as train.py, first enrollment only")
+    parser.add_argument("--restart", action="store_true", help="ignore the journal of an earlier run")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    dataset_path.mkdir(exist_ok=True)
+    work_dir = dataset_path / WORK_DIR
+    if args.restart and work_dir.exists():
+        shutil.rmtree(work_dir)
+    work_dir.mkdir(exist_ok=True)
+    journal = Journal(work_dir / JOURNAL)
+    catalog = FaceCatalog(dataset_path)
+
+    work, invalid = find_work(args.root)
+    if invalid:
+        print(f"Ignoring {len(invalid)} entries that are not valid names: {', '.join(invalid)}")
+    if args.mode == "skip":
+        enrolled = {p["name"] for p in catalog.people()}
+        skipped = sorted(n for n in work if n in enrolled and n not in journal.people)
+        for name in skipped:
+            del work[name]
+        if skipped:
+            print(f"Skipping {len(skipped)} people already enrolled (use --mode replace/append): {', '.join(skipped)}")
+    for name in journal.people & set(work):
+        del work[name]
+
+    # Fix the preprocessing settings before the workers load them
+    gallery_preprocessor(dataset_path, clahe=args.clahe, align=args.align)
+
+    pending = {}      # person -> set of file keys still to do
+    parts = {}        # person -> [per-file result files]
+    tasks = []
+    for name, files in work.items():
+        pending[name] = set()
+        parts[name] = []
+        for path in files:
+            key = file_key(path)
+            part = work_dir / f"{key}.npz"
+            parts[name].append(part)
+            if key in journal.files and part.exists():
+                continue
+            pending[name].add(key)
+            tasks.append((name, path, key, part))
+
+    total_files = sum(len(f) for f in work.values())
+    print(f"{len(work)} people, {total_files} files, {total_files - len(tasks)} already done from an earlier run")
+
+    enrolled_now = 0
+    for name in [n for n in work if not pending[n]]:
+        # Everything was processed before the interruption; just assemble
+        samples = finish_person(name, parts[name], args.mode, args.max_samples, catalog)
+        journal.write({"person": name, "samples": samples})
+        enrolled_now += 1
+
+    start = time.perf_counter()
+    done = faces_found = 0
+    failed = []         # files left out of the journal, retried on the next run
+    if tasks:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(str(dataset_path), EMBED_MODEL.exists())) as pool:
+            futures = {pool.submit(process_file, path): (name, path, key, part)
+                       for name, path, key, part in tasks}
+            try:
+                for future in as_completed(futures):
+                    name, path, key, part = futures[future]
+                    done += 1
+                    try:
+                        faces, embeddings = future.result()
+                    except BrokenProcessPool:
+                        raise       # a worker died; every other result is lost too
+                    except Exception as e:
+                        # Not journaled, so the person stays pending and the file is retried
+                        print(f"\n  {path}: failed ({e})")
+                        failed.append(path)
+                        continue
+                    arrays = {"faces": faces}
+                    if embeddings is not None:
+                        arrays["embeddings"] = embeddings
+                    with open(part, "wb") as f:
+                        np.savez(f, **arrays)
+                    journal.write({"file": str(path), "key": key, "person": name, "faces": len(faces)})
+                    faces_found += len(faces)
+
+                    pending[name].discard(key)
+                    if not pending[name]:
+                        samples = finish_person(name, parts[name], args.mode, args.max_samples, catalog)
+                        journal.write({"person": name, "samples": samples})
+                        enrolled_now += 1
+                        print(f"\n  Enrolled {name}: {samples} samples")
+
+                    elapsed = time.perf_counter() - start
+                    rate = done / elapsed if elapsed else 0.0
+                    eta = (len(tasks) - done) / rate if rate else 0.0
+                    print(f"\r[{done}/{len(tasks)} files] {faces_found} faces, {enrolled_now} people, "
+                          f"{rate:.1f} files/s, ETA {eta / 60:.1f} min", end="", flush=True)
+            except (KeyboardInterrupt, BrokenProcessPool) as e:
+                if isinstance(e, BrokenProcessPool):
+                    print(f"\nA worker process died ({e}); stopping.")
+                else:
+                    print("\nInterrupted.")
+                print("Run the same command again to resume.")
+                for future in futures:
+                    future.cancel()
+                journal.close()
+                catalog.close()
+                sys.exit(1)
+        print()
+
+    journal.close()
+    catalog.close()
+    if enrolled_now:
+        print("Calibrating unknown-face thresholds...")
+        load_recognizer(dataset_path, verbose=False)
+    if failed:
+        waiting = sorted(name for name in work if pending[name])
+        print(f"{len(failed)} files failed; not enrolled yet: {', '.join(waiting)}")
+        print("Run the same command again to retry them.")
+        sys.exit(1)
+    # Everything is in the gallery now; a later run starts fresh
+    shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"Done: {enrolled_now} people enrolled in {dataset_path}")
+
+
+if __name__ == "__main__":
+    main()
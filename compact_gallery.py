@@ -0,0 +1,239 @@
+"""Compact the gallery into a few prototypes per person.
+
+Every enrolled person brings up to 200 samples and identify() scans them
+all. Compaction picks K representative samples per person in the
+recognizer's feature space (LBPH histograms, raw pixels for KNN, or
+embeddings):
+
+    kmeans  the sample nearest each of K k-means centroids
+    fps     farthest-point sampling, spreading K samples over the person's
+            range of poses and lighting under the backend's own distance
+
+Prototypes are real samples, so every backend (LBPH included) can train on
+them unchanged. The selection is cached in data/prototypes.json, and the
+compacted gallery gets its own calibration with probes from all samples.
+
+    python compact_gallery.py --backend lbph --prototypes 8
+    python recognise.py --prototypes 8
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from face_pipeline import (dataset_path, Gallery, FaceRecognizer, BACKENDS, FAR_TARGET,
+                           CALIBRATION_PROBES, CALIBRATION_GAP, gallery_signature,
+                           load_calibration, thresholds_for, load_recognizer)
+
+PROTOTYPES_FILE = "prototypes.json"
+PROTOTYPES = 8
+METHODS = ("kmeans", "fps")
+KMEANS_ITERATIONS = 20
+
+
+def kmeans_medoids(features, k, seed=0):
+    """Indices of the samples nearest each of k k-means centroids (k-means++ start)."""
+    rng = np.random.default_rng(seed)
+    x = features.astype(np.float64)
+    sq = (x * x).sum(axis=1)
+    centers = [x[rng.integers(len(x))]]
+    for _ in range(1, k):
+        d = np.min([sq - 2 * x @ c + c @ c for c in centers], axis=0).clip(min=0)
+        p = d / d.sum() if d.sum() > 0 else None
+        centers.append(x[rng.choice(len(x), p=p)])
+    centers = np.array(centers)
+
+    for _ in range(KMEANS_ITERATIONS):
+        d = sq[:, None] - 2 * x @ centers.T + (centers * centers).sum(axis=1)[None, :]
+        assign = d.argmin(axis=1)
+        moved = centers.copy()
+        for j in range(k):
+            members = x[assign == j]
+            if len(members):
+                moved[j] = members.mean(axis=0)
+            else:
+                # Empty cluster: restart it on the worst-served sample
+                moved[j] = x[d[np.arange(len(x)), assign].argmax()]
+        if np.allclose(moved, centers):
+            break
+        centers = moved
+
+    d = sq[:, None] - 2 * x @ centers.T + (centers * centers).sum(axis=1)[None, :]
+    chosen = []
+    for j in range(k):
+        for i in np.argsort(d[:, j]):
+            if i not in chosen:
+                chosen.append(int(i))
+                break
+    return sorted(chosen)
+
+
+def farthest_points(features, k, distances):
+    """Indices of k samples spread out under `distances(probe, features)`.
+
+    Starts from the sample nearest the mean, then keeps adding the sample
+    farthest from everything chosen so far.
+    """
+    mean = features.mean(axis=0)
+    first = int(np.argmin(((features - mean) ** 2).sum(axis=1)))
+    chosen = [first]
+    nearest = distances(features[first], features)
+    while len(chosen) < k:
+        i = int(np.argmax(nearest))
+        if nearest[i] <= 0:
+            break           # only duplicates left
+        chosen.append(i)
+        nearest = np.minimum(nearest, distances(features[i], features))
+    return sorted(chosen)
+
+
+def select_prototypes(recognizer, per_person=PROTOTYPES, method="kmeans", features=None):
+    """Boolean mask over the recognizer's gallery marking the prototypes."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown compaction method {method!r}")
+    gallery = recognizer.gallery
+    features = recognizer.features() if features is None else features
+    mask = np.zeros(len(gallery), dtype=bool)
+    for label in gallery.names:
+        own = np.flatnonzero(gallery.labels == label)
+        if len(own) <= per_person:
+            mask[own] = True
+            continue
+        if method == "kmeans":
+            picked = kmeans_medoids(features[own], per_person)
+        else:
+            picked = farthest_points(features[own], per_person, recognizer.distances)
+        mask[own[picked]] = True
+    return mask
+
+
+def load_selection(recognizer, per_person=PROTOTYPES, method="kmeans", path=dataset_path):
+    """Cached select_prototypes(), recomputed when the gallery changed.
+
+    Keyed like the calibration, so a re-enrollment with the same number of
+    samples doesn't reuse indices picked from the old ones.
+    """
+    file = Path(path) / PROTOTYPES_FILE
+    signature = gallery_signature(recognizer.gallery, path)
+    key = f"{recognizer.backend}/{method}{per_person}"
+    saved = {}
+    if file.exists():
+        try:
+            saved = json.loads(file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            saved = {}
+    if saved.get("gallery") != signature:
+        saved = {"gallery": signature, "selections": {}}
+    if key not in saved["selections"]:
+        mask = select_prototypes(recognizer, per_person, method)
+        saved["selections"][key] = np.flatnonzero(mask).tolist()
+        try:
+            file.write_text(json.dumps(saved), encoding="utf-8")
+        except OSError as e:
+            print(f"Could not save prototypes: {e}")
+    mask = np.zeros(len(recognizer.gallery), dtype=bool)
+    mask[saved["selections"][key]] = True
+    return mask
+
+
+def compact_recognizer(recognizer, per_person=PROTOTYPES, method="kmeans", path=dataset_path, far=FAR_TARGET):
+    """A calibrated recognizer over the prototypes of `recognizer`'s gallery."""
+    gallery = recognizer.gallery
+    mask = load_selection(recognizer, per_person, method, path)
+    # Calibrated on the full recognizer's features, restricted to the prototypes
+    calibration = load_calibration(recognizer, path, members=mask, variant=f"{method}{per_person}")
+    compact = FaceRecognizer(Gallery(gallery.faces[mask], gallery.labels[mask], dict(gallery.names)),
+                             backend=recognizer.backend, embedder=getattr(recognizer, "embedder", None))
+    compact.version = recognizer.version
+    compact.prototypes = (per_person, method)
+    compact.set_calibration(calibration, far)
+    return compact
+
+
+def evaluate(recognizer, features, members, thresholds, probes=CALIBRATION_PROBES, gap=CALIBRATION_GAP, seed=1):
+    """Identification on held-out samples matched against `members` only.
+
+    Returns (rank-1 accuracy, share accepted as the right person within the
+    thresholds, mean seconds per probe). Uses a different seed from
+    calibration so the probes are not the ones the thresholds were fit on.
+    """
+    gallery = recognizer.gallery
+    labels = gallery.labels
+    index = np.arange(len(gallery))
+    rng = np.random.default_rng(seed)
+    correct = accepted = total = 0
+    elapsed = 0.0
+    matched = features[members]
+    for label, name in gallery.names.items():
+        own = index[labels == label]
+        for i in rng.choice(own, size=min(probes, len(own)), replace=False):
+            start = time.perf_counter()
+            recognizer.distances(features[i], matched)      # the cost identify() pays
+            elapsed += time.perf_counter() - start
+            dist = recognizer.distances(features[i], features)
+            keep = members & ((labels != label) | (np.abs(index - i) > gap))
+            scores = {other: recognizer.person_distance(dist[keep & (labels == other)])
+                      for other in gallery.names if (keep & (labels == other)).any()}
+            if not scores:
+                continue
+            best = min(scores, key=scores.get)
+            total += 1
+            if best == label:
+                correct += 1
+                threshold = thresholds.get(name)
+                accepted += threshold is None or scores[best] <= threshold
+    if not total:
+        return None, None, None
+    return correct / total, accepted / total, elapsed / total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact the gallery into per-person prototypes and "
+                                                 "compare accuracy with the full gallery.")
+    parser.add_argument("--backend", choices=BACKENDS, default="lbph")
+    parser.add_argument("--prototypes", type=int, default=PROTOTYPES, help="prototypes per person")
+    parser.add_argument("--method", choices=METHODS, default="kmeans")
+    parser.add_argument("--far", type=float, default=FAR_TARGET)
+    parser.add_argument("--gallery", default=str(dataset_path), help="enrolled faces (default: data/)")
+    args = parser.parse_args()
+
+    print("Loading the full gallery...")
+    full = load_recognizer(args.gallery, backend=args.backend, far=args.far, verbose=False)
+    if full is None:
+        print(f"No enrolled faces in {args.gallery}.")
+        sys.exit(1)
+    gallery = full.gallery
+    features = full.features()
+
+    start = time.perf_counter()
+    mask = load_selection(full, args.prototypes, args.method, args.gallery)
+    selected = time.perf_counter() - start
+    variant = f"{args.method}{args.prototypes}"
+    compact_thresholds = thresholds_for(
+        load_calibration(full, args.gallery, members=mask, variant=variant), args.far)
+
+    everything = np.ones(len(gallery), dtype=bool)
+    full_acc, full_tar, full_s = evaluate(full, features, everything, full.thresholds)
+    compact_acc, compact_tar, compact_s = evaluate(full, features, mask, compact_thresholds)
+
+    kept = int(mask.sum())
+    full_mb = gallery.faces.nbytes / 2 ** 20
+    print(f"\n{args.backend} / {args.method}, {args.prototypes} per person ({selected:.1f} s):")
+    print(f"  samples   {len(gallery):>8} -> {kept:<8} ({kept / len(gallery):.1%})")
+    print(f"  gallery   {full_mb:>8.2f} -> {full_mb * kept / len(gallery):<8.2f} MB")
+    if full_acc is None:
+        print("  Not enough samples to evaluate.")
+        return
+    print(f"  accuracy  {full_acc:>8.2%} -> {compact_acc:<8.2%} ({(compact_acc - full_acc) * 100:+.1f} points)")
+    print(f"  accepted  {full_tar:>8.2%} -> {compact_tar:<8.2%} ({(compact_tar - full_tar) * 100:+.1f} points) "
+          f"at {args.far:.1%} false accepts")
+    print(f"  match     {full_s * 1000:>8.3f} -> {compact_s * 1000:<8.3f} ms per face")
+    print(f"\nUse it with: python recognise.py --backend {args.backend} "
+          f"--prototypes {args.prototypes} --compaction {args.method}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+MODEL_NAME = 'all-MiniLM-L6-v2'
+ONNX_DIR = BASE_DIR / "models" / "minilm-onnx"     # written by export_encoder.py
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+# Every backend exposes encode(texts, batch_size) -> float32 array of shape
+# (len(texts), dim) with L2-normalised rows, so cosine similarity is a dot product.
+
+class TorchEncoder:
+    def __init__(self, model_name=MODEL_NAME, quantize=False):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        if quantize:
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def encode(self, texts, batch_size=64):
+        return self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True,
+                                 normalize_embeddings=True).astype(np.float32, copy=False)
+
+
+class OnnxEncoder:
+    # Mean pooling + normalisation, the same head SentenceTransformer puts on MiniLM
+    def __init__(self, model_dir=ONNX_DIR, file_name="model.onnx", max_length=256, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        model_path = model_dir / file_name
+        if not model_path.exists():
+            raise FileNotFoundError(f"{model_path} not found. Run export_encoder.py first.")
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts, batch_size=64):
+        texts = list(texts)
+        out = []
+        for i in range(0, len(texts), batch_size):
+            out.append(self._encode_batch(texts[i:i + batch_size]))
+        if not out:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(out, axis=0)
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embs = self.session.run(None, feeds)[0]
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (token_embs * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def load_encoder(backend="torch"):
+    if backend == "torch":
+        return TorchEncoder()
+    if backend == "torch-int8":
+        return TorchEncoder(quantize=True)
+    if backend == "onnx":
+        return OnnxEncoder()
+    if backend == "onnx-int8":
+        return OnnxEncoder(file_name="model_int8.onnx")
+    raise ValueError(f"Unknown encoder backend {backend!r}; choose from {', '.join(BACKENDS)}")
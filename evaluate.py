@@ -0,0 +1,115 @@
+"""Offline evaluation of the FAQ matcher in queries.py.
+
+Input is a text file with one question per line. A line may carry the
+expected FAQ question after a tab; use "unknown" for questions the bot
+should not answer. Lines without a label only count towards throughput.
+
+    python evaluate.py logged_questions.tsv
+    python evaluate.py logged_questions.tsv --semantic 0.4 0.8 0.05 --fuzzy 20 90 10
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import queries
+
+
+def load_questions(path):
+    questions, expected = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            question, _, label = line.partition("\t")
+            questions.append(question.strip())
+            expected.append(label.strip().lower() or None)
+    return questions, expected
+
+
+def expected_indices(expected):
+    # Map labels onto the indices choose_indices() returns
+    lookup = {queries.clean(q): i for i, q in enumerate(queries.faq_questions)}
+    indices = []
+    for label in expected:
+        if label is None:
+            indices.append(None)
+        elif label == "unknown":
+            indices.append(queries.UNKNOWN)
+        elif queries.clean(label) in lookup:
+            indices.append(lookup[queries.clean(label)])
+        else:
+            raise ValueError(f"Label is not an FAQ question: {label!r}")
+    return indices
+
+
+def accuracy(chosen, expected):
+    pairs = [(c, e) for c, e in zip(chosen, expected) if e is not None]
+    if not pairs:
+        return None
+    # An empty query is as wrong as any other miss unless "unknown" was expected
+    hits = sum(1 for c, e in pairs if c == e or (e == queries.UNKNOWN and c == queries.EMPTY))
+    return hits / len(pairs)
+
+
+def frange(start, stop, step):
+    return [round(v, 4) for v in np.arange(start, stop + step / 2, step)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the FAQ matcher against a file of questions.")
+    parser.add_argument("questions", help="file with one question per line, optional <TAB>expected FAQ question")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--semantic", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+                        default=(0.30, 0.80, 0.05), help="semantic_threshold sweep")
+    parser.add_argument("--fuzzy", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+                        default=(10, 90, 10), help="fuzzy_threshold sweep")
+    parser.add_argument("--top", type=int, default=10, help="rows of the sweep to print")
+    parser.add_argument("--json", help="also write the full report to this file")
+    args = parser.parse_args()
+
+    questions, labels = load_questions(args.questions)
+    if not questions:
+        print("No questions found.")
+        return
+    expected = expected_indices(labels)
+
+    start = time.perf_counter()
+    scores = queries.score_queries(questions, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    default = queries.choose_indices(scores)
+
+    report = {
+        "questions": len(questions),
+        "labelled": sum(e is not None for e in expected),
+        "seconds": elapsed,
+        "queries_per_second": len(questions) / elapsed if elapsed else None,
+        "default_accuracy": accuracy(default, expected),
+        "sweep": [],
+    }
+
+    print(f"Questions: {report['questions']} ({report['labelled']} labelled)")
+    print(f"Scored in {elapsed:.2f} s  ->  {report['queries_per_second']:.1f} queries/s")
+    if report["default_accuracy"] is not None:
+        print(f"Accuracy at defaults (semantic 0.55, fuzzy 30): {report['default_accuracy']:.3f}")
+
+    if report["labelled"]:
+        for st in frange(*args.semantic):
+            for ft in frange(*args.fuzzy):
+                choose = queries.choose_indices(scores, st, ft)
+                report["sweep"].append({"semantic_threshold": st, "fuzzy_threshold": ft,
+                                        "accuracy": accuracy(choose, expected)})
+        best = sorted(report["sweep"], key=lambda r: r["accuracy"], reverse=True)[:args.top]
+        print("\nsemantic  fuzzy  accuracy")
+        for row in best:
+            print(f"{row['semantic_threshold']:>8.2f}  {row['fuzzy_threshold']:>5.0f}  {row['accuracy']:.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
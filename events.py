@@ -0,0 +1,83 @@
+import json
+import os
+import socket
+import sys
+import threading
+
+
+class StdoutSink:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def emit(self, event):
+        self.stream.write(json.dumps(event) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class SocketSink:
+    """Broadcasts JSON lines to every client connected to a local socket.
+
+    Slow or vanished clients are dropped instead of stalling the camera loop.
+    """
+
+    def __init__(self, address, family=socket.AF_INET):
+        self.family = family
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        elif os.path.exists(address):
+            os.unlink(address)
+        self.address = address
+        self.server.bind(address)
+        self.server.listen()
+        self.clients = []
+        self._lock = threading.Lock()
+        self._closed = False
+        threading.Thread(target=self._accept_loop, name="events-accept", daemon=True).start()
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            conn.settimeout(0.05)
+            with self._lock:
+                self.clients.append(conn)
+
+    def emit(self, event):
+        data = (json.dumps(event) + "\n").encode("utf-8")
+        with self._lock:
+            for conn in list(self.clients):
+                try:
+                    conn.sendall(data)
+                except OSError:
+                    conn.close()
+                    self.clients.remove(conn)
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            for conn in self.clients:
+                conn.close()
+            self.clients = []
+        self.server.close()
+        if self.family != socket.AF_INET and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+def open_sink(spec):
+    """Sink for "stdout", "tcp://127.0.0.1:8765" or "unix:///tmp/aura_faces.sock"."""
+    if not spec or spec == "none":
+        return None
+    if spec == "stdout":
+        return StdoutSink()
+    if spec.startswith("tcp://"):
+        host, _, port = spec[len("tcp://"):].rpartition(":")
+        return SocketSink((host or "127.0.0.1", int(port)))
+    if spec.startswith("unix://"):
+        return SocketSink(spec[len("unix://"):], family=socket.AF_UNIX)
+    raise ValueError(f"Unknown event sink {spec!r}")
@@ -0,0 +1,48 @@
+"""Export all-MiniLM-L6-v2 to ONNX for the "onnx" and "onnx-int8" encoder backends.
+
+Needs torch, sentence-transformers and onnxruntime on the machine doing the
+export; the robot itself only needs onnxruntime and tokenizers afterwards.
+
+    python export_encoder.py [output_dir]
+"""
+import sys
+from pathlib import Path
+
+import torch
+from sentence_transformers import SentenceTransformer
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+from encoders import MODEL_NAME, ONNX_DIR
+
+
+def main():
+    out_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else ONNX_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    st_model = SentenceTransformer(MODEL_NAME, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(str(out_dir))    # writes tokenizer.json
+
+    sample = tokenizer(["who teaches math"], return_tensors="pt")
+    inputs = (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"])
+    dynamic = {"input_ids": {0: "batch", 1: "seq"},
+               "attention_mask": {0: "batch", 1: "seq"},
+               "token_type_ids": {0: "batch", 1: "seq"},
+               "token_embeddings": {0: "batch", 1: "seq"}}
+
+    model_path = out_dir / "model.onnx"
+    with torch.no_grad():
+        torch.onnx.export(transformer, inputs, str(model_path),
+                          input_names=["input_ids", "attention_mask", "token_type_ids"],
+                          output_names=["token_embeddings"],
+                          dynamic_axes=dynamic, opset_version=14)
+    print(f"Saved {model_path}")
+
+    int8_path = out_dir / "model_int8.onnx"
+    quantize_dynamic(str(model_path), str(int8_path), weight_type=QuantType.QInt8)
+    print(f"Saved {int8_path}")
+
+
+if __name__ == "__main__":
+    main()
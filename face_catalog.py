@@ -0,0 +1,241 @@
+"""SQLite index of the enrolled faces in data/.
+
+Each person is one <name>.npy file of normalized faces. The catalog records
+its sample count, where the sample data starts in the file, a checksum and
+the version at which it last changed. Every change is logged, so a running
+recognizer can ask changes_since(version) instead of rescanning the folder.
+Rename, delete and merge go through here so the files and the index move
+together.
+"""
+from pathlib import Path
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+CATALOG_FILE = "catalog.db"
+# Per-person files derived from the samples (face_embedding.EMBEDDINGS_DIR,
+# lbp.HISTOGRAMS_DIR); they follow renames, deletes and merges
+COMPANION_DIRS = ("embeddings", "lbp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    name        TEXT PRIMARY KEY,
+    file        TEXT NOT NULL,
+    samples     INTEGER NOT NULL,
+    data_offset INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    checksum    TEXT NOT NULL,
+    enrolled_at REAL NOT NULL,
+    version     INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    name    TEXT NOT NULL,
+    action  TEXT NOT NULL,          -- add, update, rename, delete, merge
+    detail  TEXT,                   -- previous name (rename) or merged-in names
+    at      REAL NOT NULL
+);
+"""
+
+
+class CatalogError(Exception):
+    pass
+
+
+def check_name(name):
+    name = name.strip()
+    if not name or any(c in name for c in '/\\:') or name.startswith("."):
+        raise CatalogError(f"Invalid name {name!r}")
+    return name
+
+
+def checksum(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def npy_layout(path):
+    """(samples, byte offset of the first sample) from the .npy header."""
+    with open(path, "rb") as f:
+        major, _ = np.lib.format.read_magic(f)
+        if major == 1:
+            shape, _, _ = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, _ = np.lib.format.read_array_header_2_0(f)
+        return (shape[0] if shape else 0), f.tell()
+
+
+class FaceCatalog:
+    def __init__(self, folder, sync=True):
+        self.folder = Path(folder)
+        self.folder.mkdir(exist_ok=True)
+        self.db = sqlite3.connect(str(self.folder / CATALOG_FILE))
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        if sync:
+            self.sync()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+    def version(self):
+        row = self.db.execute("SELECT MAX(version) FROM changes").fetchone()
+        return row[0] or 0
+
+    def people(self):
+        return self.db.execute("SELECT * FROM people ORDER BY name").fetchall()
+
+    def get(self, name):
+        return self.db.execute("SELECT * FROM people WHERE name = ?", (name,)).fetchone()
+
+    def changes_since(self, version):
+        """[(version, name, action, detail), ...] newer than `version`, oldest first."""
+        return [tuple(row) for row in self.db.execute(
+            "SELECT version, name, action, detail FROM changes WHERE version > ? ORDER BY version",
+            (version,))]
+
+    # -----------------------------
+    # Updates
+    # -----------------------------
+    def _log(self, name, action, detail=None):
+        cur = self.db.execute("INSERT INTO changes (name, action, detail, at) VALUES (?, ?, ?, ?)",
+                              (name, action, detail, time.time()))
+        return cur.lastrowid
+
+    def _index(self, name, action, detail=None, enrolled_at=None):
+        path = self.folder / f"{name}.npy"
+        stat = path.stat()
+        samples, offset = npy_layout(path)
+        version = self._log(name, action, detail)
+        self.db.execute(
+            "INSERT OR REPLACE INTO people (name, file, samples, data_offset, size, mtime_ns, "
+            "checksum, enrolled_at, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, path.name, samples, offset, stat.st_size, stat.st_mtime_ns,
+             checksum(path), enrolled_at or time.time(), version))
+        return version
+
+    def record(self, name):
+        """Index <name>.npy after it was written (new person or re-enrollment)."""
+        with self.db:
+            existing = self.get(name)
+            return self._index(name, "update" if existing else "add",
+                               enrolled_at=existing["enrolled_at"] if existing else None)
+
+    def sync(self):
+        """Pick up .npy files added, replaced or removed outside the catalog."""
+        on_disk = {p.stem: p for p in self.folder.glob("*.npy")}
+        with self.db:
+            for row in self.people():
+                path = on_disk.pop(row["name"], None)
+                if path is None:
+                    self._log(row["name"], "delete")
+                    self.db.execute("DELETE FROM people WHERE name = ?", (row["name"],))
+                    continue
+                stat = path.stat()
+                if (stat.st_size, stat.st_mtime_ns) != (row["size"], row["mtime_ns"]):
+                    if checksum(path) != row["checksum"]:
+                        self._index(row["name"], "update", enrolled_at=row["enrolled_at"])
+                    else:
+                        self.db.execute("UPDATE people SET mtime_ns = ? WHERE name = ?",
+                                        (stat.st_mtime_ns, row["name"]))
+            for name in sorted(on_disk):
+                self._index(name, "add")
+
+    def _companions(self, name):
+        return [self.folder / d / f"{name}.npy" for d in COMPANION_DIRS]
+
+    def rename(self, old, new):
+        new = check_name(new)
+        if self.get(old) is None:
+            raise CatalogError(f"{old} is not enrolled")
+        if self.get(new) is not None or (self.folder / f"{new}.npy").exists():
+            raise CatalogError(f"{new} already exists")
+        with self.db:
+            # The index is only committed once the file has moved
+            version = self._log(new, "rename", old)
+            self.db.execute("UPDATE people SET name = ?, file = ?, version = ? WHERE name = ?",
+                            (new, f"{new}.npy", version, old))
+            os.replace(self.folder / f"{old}.npy", self.folder / f"{new}.npy")
+        for src, dst in zip(self._companions(old), self._companions(new)):
+            if src.exists():
+                os.replace(src, dst)
+        return version
+
+    def delete(self, name):
+        if self.get(name) is None:
+            raise CatalogError(f"{name} is not enrolled")
+        path = self.folder / f"{name}.npy"
+        trash = path.with_suffix(".npy.deleting")
+        with self.db:
+            version = self._log(name, "delete")
+            self.db.execute("DELETE FROM people WHERE name = ?", (name,))
+            os.replace(path, trash)
+        trash.unlink()
+        for companion in self._companions(name):
+            companion.unlink(missing_ok=True)
+        return version
+
+    def merge(self, sources, target):
+        """Fold the samples of `sources` into `target` (created if new) and remove the sources."""
+        target = check_name(target)
+        sources = [s for s in sources if s != target]
+        missing = [s for s in sources if self.get(s) is None]
+        if missing or not sources:
+            raise CatalogError(f"Nothing to merge: {', '.join(missing) or 'no sources'}")
+        existing = self.get(target)
+        names = ([target] if existing else []) + sources
+        faces = np.concatenate([np.load(self.folder / f"{n}.npy") for n in names], axis=0)
+
+        target_path = self.folder / f"{target}.npy"
+        tmp = self.folder / f"{target}.npy.merging"
+        with open(tmp, "wb") as f:      # a file object, so np.save doesn't add .npy
+            np.save(f, faces)
+        moved = []
+        try:
+            with self.db:
+                for name in sources:
+                    self.db.execute("DELETE FROM people WHERE name = ?", (name,))
+                    path = self.folder / f"{name}.npy"
+                    os.replace(path, path.with_suffix(".npy.deleting"))
+                    moved.append(path)
+                os.replace(tmp, target_path)
+                version = self._index(target, "merge", ",".join(sources),
+                                      enrolled_at=existing["enrolled_at"] if existing else None)
+        except Exception:
+            # The index rolled back; put the files back to match it
+            for path in moved:
+                os.replace(path.with_suffix(".npy.deleting"), path)
+            if tmp.exists():
+                tmp.unlink()
+            raise
+        for path in moved:
+            path.with_suffix(".npy.deleting").unlink()
+
+        # Derived files: combine them when every part had one, otherwise
+        # drop the target's so it is rebuilt from the merged samples
+        for i, target_file in enumerate(self._companions(target)):
+            parts = [self._companions(n)[i] for n in names]
+            if all(p.exists() for p in parts):
+                combined = np.concatenate([np.load(p) for p in parts], axis=0)
+                np.save(target_file, combined)
+            else:
+                target_file.unlink(missing_ok=True)
+            for name in sources:
+                self._companions(name)[i].unlink(missing_ok=True)
+        return version
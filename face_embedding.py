@@ -0,0 +1,97 @@
+"""Face embeddings from a local ONNX model, run through cv2.dnn.
+
+The default model is OpenCV Zoo's SFace (face_recognition_sface_2021dec.onnx,
+112x112 input, 128-d output), placed in assets/. Embeddings are L2-normalized
+so matching is a dot product. They are computed from the colour crop at
+enrollment and kept per person in data/embeddings/<name>.npy, next to the
+grayscale samples the other backends use.
+
+SFace was trained on crops aligned from five facial landmarks
+(cv2.FaceRecognizerSF.alignCrop). The SSD detector gives no landmarks, so
+the model is given plain detector boxes resized to 112x112. Distances are
+therefore larger than published. The published cut-off
+(face_pipeline.EMBED_THRESHOLD) is only a fallback until the gallery has
+been calibrated; the calibrated per-person thresholds are what apply.
+"""
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from face_pipeline import Gallery, assets_path, dataset_path
+
+EMBED_MODEL = assets_path / "face_recognition_sface_2021dec.onnx"
+EMBED_INPUT = (112, 112)
+EMBEDDINGS_DIR = "embeddings"
+EMBED_BATCH = 32
+
+
+class FaceEmbedder:
+    def __init__(self, model=EMBED_MODEL, input_size=EMBED_INPUT):
+        if not Path(model).exists():
+            raise FileNotFoundError(f"Face embedding model not found: {model}")
+        self.net = cv2.dnn.readNetFromONNX(str(model))
+        self.input_size = input_size
+
+    def embed(self, faces):
+        """(N, D) float32 unit vectors for BGR or grayscale face crops (unaligned)."""
+        out = []
+        for start in range(0, len(faces), EMBED_BATCH):
+            batch = [f if f.ndim == 3 else cv2.cvtColor(f, cv2.COLOR_GRAY2BGR)
+                     for f in faces[start:start + EMBED_BATCH]]
+            blob = cv2.dnn.blobFromImages(batch, 1.0, self.input_size, (0, 0, 0), swapRB=True)
+            self.net.setInput(blob)
+            out.append(self.net.forward().reshape(len(batch), -1))
+        if not out:
+            return np.empty((0, 0), dtype=np.float32)
+        vectors = np.concatenate(out).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        return vectors
+
+
+def embeddings_file(path, name):
+    return Path(path) / EMBEDDINGS_DIR / f"{name}.npy"
+
+
+def save_embeddings(path, name, embeddings):
+    file = embeddings_file(path, name)
+    file.parent.mkdir(exist_ok=True)
+    np.save(file, embeddings.astype(np.float32))
+
+
+def person_embeddings(path, name, embedder):
+    """Stored embeddings for `name`, or computed from the grayscale samples.
+
+    Grayscale fallbacks (galleries enrolled before this backend existed)
+    work, but re-enrolling gives the model the colour it was trained on.
+    """
+    samples_file = Path(path) / f"{name}.npy"
+    file = embeddings_file(path, name)
+    if file.exists() and file.stat().st_mtime >= samples_file.stat().st_mtime:
+        return np.load(file)
+    print(f" Computing embeddings for {name} from stored grayscale samples")
+    embeddings = embedder.embed(list(np.load(samples_file)))
+    save_embeddings(path, name, embeddings)
+    return embeddings
+
+
+def load_embedding_gallery(path=dataset_path, embedder=None, verbose=True):
+    """Gallery whose faces are (N, D) embeddings, same people and labels as load_gallery()."""
+    embedder = embedder or FaceEmbedder()
+    vectors, labels, names = [], [], {}
+    for class_id, file in enumerate(sorted(Path(path).glob("*.npy"))):
+        names[class_id] = file.stem
+        if verbose:
+            print(" Loaded:", file.name)
+        data_item = person_embeddings(path, file.stem, embedder)
+        vectors.append(data_item)
+        labels.append(np.full(len(data_item), class_id, dtype=np.int32))
+    if not vectors:
+        return None
+    return Gallery(np.concatenate(vectors, axis=0), np.concatenate(labels, axis=0), names)
+
+
+def embed_gallery(gallery, embedder=None):
+    """Embedding gallery from a gallery of grayscale crops (benchmarks, synthetic data)."""
+    embedder = embedder or FaceEmbedder()
+    return Gallery(embedder.embed(list(gallery.faces)), gallery.labels, gallery.names)
@@ -0,0 +1,162 @@
+"""Thumbnail picker for the enrolled people, used by Manage Dataset.
+
+Only names and counts come from the catalog up front. Each thumbnail is one
+sample read through a memory-mapped np.load, cached as a small PNG in
+data/.thumbs and loaded on a worker thread when its row scrolls into view,
+so the dialog opens immediately however large the gallery is.
+"""
+from pathlib import Path
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, QListView,
+    QPushButton, QLabel
+)
+from PyQt5.QtGui import QImage, QPixmap, QIcon
+from PyQt5.QtCore import Qt, QSize, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+THUMB_SIZE = 96
+THUMBS_DIR = ".thumbs"
+
+
+def thumbnail_path(folder, person):
+    # Keyed by checksum, so a re-enrolled or merged person gets a new picture
+    return Path(folder) / THUMBS_DIR / f"{person['name']}-{person['checksum'][:12]}.png"
+
+
+def load_thumbnail(folder, person):
+    """QImage of one representative sample, from the PNG cache when possible.
+
+    QImage (unlike QPixmap) is safe to build off the GUI thread.
+    """
+    cached = thumbnail_path(folder, person)
+    if cached.exists():
+        image = QImage(str(cached))
+        if not image.isNull():
+            return image
+
+    samples = np.load(Path(folder) / person["file"], mmap_mode="r")
+    if not len(samples):
+        return QImage()
+    sample = np.ascontiguousarray(samples[len(samples) // 2])  # touches one sample's pages only
+    side = int(np.sqrt(sample.size))
+    sample = sample.reshape(side, side).astype(np.uint8)
+    image = QImage(sample.data, side, side, side, QImage.Format_Grayscale8)
+    image = image.scaled(THUMB_SIZE, THUMB_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    try:
+        cached.parent.mkdir(exist_ok=True)
+        for stale in cached.parent.glob(f"{person['name']}-*.png"):
+            if stale.stem.rsplit("-", 1)[0] == person["name"]:
+                stale.unlink()
+        image.save(str(cached), "PNG")
+    except OSError:
+        pass
+    return image
+
+
+class ThumbnailSignals(QObject):
+    loaded = pyqtSignal(int, QImage)     # row, image
+
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, signals, folder, row, person):
+        super().__init__()
+        self.signals = signals
+        self.folder = folder
+        self.row = row
+        self.person = person
+
+    def run(self):
+        try:
+            image = load_thumbnail(self.folder, self.person)
+        except (OSError, ValueError):
+            image = QImage()
+        self.signals.loaded.emit(self.row, image)
+
+
+class FaceGalleryDialog(QDialog):
+    def __init__(self, folder, people, parent=None, title="Manage Dataset"):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.resize(560, 480)
+        self.folder = Path(folder)
+        self.people = list(people)
+        self.requested = set()
+
+        # Scroll and resize events can come in bursts; batch them
+        self._visible_timer = QTimer(self)
+        self._visible_timer.setSingleShot(True)
+        self._visible_timer.setInterval(50)
+        self._visible_timer.timeout.connect(self._request_visible)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.signals = ThumbnailSignals()
+        self.signals.loaded.connect(self._on_loaded)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Choose a person to manage:"))
+        self.list = QListWidget()
+        self.list.setViewMode(QListView.IconMode)
+        self.list.setIconSize(QSize(THUMB_SIZE, THUMB_SIZE))
+        self.list.setGridSize(QSize(THUMB_SIZE + 40, THUMB_SIZE + 52))
+        self.list.setResizeMode(QListView.Adjust)
+        self.list.setMovement(QListView.Static)
+        self.list.setUniformItemSizes(True)
+        for person in self.people:
+            enrolled = time.strftime("%Y-%m-%d", time.localtime(person["enrolled_at"]))
+            item = QListWidgetItem(f"{person['name']}\n{person['samples']} samples")
+            item.setToolTip(f"{person['name']}: {person['samples']} samples, enrolled {enrolled}")
+            item.setTextAlignment(Qt.AlignHCenter | Qt.AlignTop)
+            self.list.addItem(item)
+        layout.addWidget(self.list)
+
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        self.ok_button = QPushButton("Manage")
+        self.ok_button.setEnabled(False)
+        cancel_button = QPushButton("Cancel")
+        buttons.addWidget(self.ok_button)
+        buttons.addWidget(cancel_button)
+        layout.addLayout(buttons)
+
+        self.ok_button.clicked.connect(self.accept)
+        cancel_button.clicked.connect(self.reject)
+        self.list.itemDoubleClicked.connect(lambda _: self.accept())
+        self.list.currentRowChanged.connect(lambda row: self.ok_button.setEnabled(row >= 0))
+        self.list.verticalScrollBar().valueChanged.connect(self._load_visible)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._load_visible()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._load_visible()
+
+    def _load_visible(self, *_):
+        self._visible_timer.start()
+
+    def _request_visible(self):
+        viewport = self.list.viewport().rect()
+        for row in range(self.list.count()):
+            if row in self.requested:
+                continue
+            if self.list.visualItemRect(self.list.item(row)).intersects(viewport):
+                self.requested.add(row)
+                self.pool.start(ThumbnailTask(self.signals, self.folder, row, self.people[row]))
+
+    def _on_loaded(self, row, image):
+        if not image.isNull() and row < self.list.count():
+            self.list.item(row).setIcon(QIcon(QPixmap.fromImage(image)))
+
+    def selected_name(self):
+        row = self.list.currentRow()
+        return self.people[row]["name"] if row >= 0 else None
+
+    def done(self, result):
+        self.pool.clear()       # drop thumbnails that haven't started
+        self.pool.waitForDone(1000)
+        super().done(result)
@@ -0,0 +1,440 @@
+from pathlib import Path
+import json
+import numpy as np
+import cv2
+import sys
+from preprocess import FACE_SIZE, load_config
+from face_catalog import FaceCatalog
+
+# Handle PyInstaller environment
+if hasattr(sys, '_MEIPASS'):
+    BASE_DIR = Path(sys._MEIPASS)
+else:
+    BASE_DIR = Path(__file__).resolve().parent
+
+dataset_path = BASE_DIR / "data"
+assets_path = BASE_DIR / "assets"
+
+modelFile = str(assets_path / "res10_300x300_ssd_iter_140000.caffemodel")
+configFile = str(assets_path / "deploy.prototxt")
+
+DETECTION_CONFIDENCE = 0.6
+
+# Unknown-face rejection
+CALIBRATION_FILE = "calibration.json"
+FAR_TARGET = 0.01           # share of other people's faces a person's threshold may accept
+CALIBRATION_PROBES = 20     # held-out samples per person
+CALIBRATION_GAP = 5         # neighbouring frames left out around a probe (near-duplicates)
+LBPH_THRESHOLD = 70.0       # used until a gallery has been calibrated
+# SFace's published 0.363 similarity cut-off, as a cosine distance. It was set
+# for aligned crops and ours are not, so it only stands in until calibration
+EMBED_THRESHOLD = 0.637
+KNN_K = 5
+
+# "lbp" and "lbp-hellinger" are the NumPy LBP histograms from lbp.py
+BACKENDS = ("lbph", "knn", "embed", "lbp", "lbp-hellinger")
+
+
+def distance(v1, v2):
+    return np.sqrt(((v1 - v2) ** 2).sum())
+
+
+def knn_score(distances, k=KNN_K):
+    """A person's KNN distance: the mean of their own k nearest samples."""
+    return float(np.sort(np.asarray(distances, dtype=np.float64))[:k].mean())
+
+
+def knn(train, test, k=5, return_distance=False):
+    dist = []
+    for i in range(train.shape[0]):
+        ix = train[i, :-1]
+        iy = train[i, -1]
+        d = distance(test, ix)
+        dist.append([d, iy])
+    dk = np.array(sorted(dist, key=lambda x: x[0])[:k])
+    labels = dk[:, -1]
+    output = np.unique(labels, return_counts=True)
+    index = np.argmax(output[1])
+    if return_distance:
+        # The vote picks the winner; its score is knn_score() of all its
+        # samples, the statistic calibrate() sets the thresholds on
+        winner = output[0][index]
+        return winner, knn_score([d for d, label in dist if label == winner], k)
+    return output[0][index]
+
+
+# -----------------------------
+# Detection
+# -----------------------------
+def load_detector():
+    return cv2.dnn.readNetFromCaffe(configFile, modelFile)
+
+
+def detect_faces(net, frame, min_confidence=DETECTION_CONFIDENCE):
+    """Return [(x1, y1, x2, y2, confidence), ...] in frame coordinates."""
+    h, w = frame.shape[:2]
+    blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)),
+                                 1.0, (300, 300),
+                                 (104.0, 177.0, 123.0))
+    net.setInput(blob)
+    detections = net.forward()
+
+    faces = []
+    for i in range(detections.shape[2]):
+        confidence = float(detections[0, 0, i, 2])
+        if confidence > min_confidence:
+            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
+            x1, y1, x2, y2 = box.astype("int")
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w - 1, x2), min(h - 1, y2)
+            if x2 > x1 and y2 > y1:
+                faces.append((x1, y1, x2, y2, confidence))
+    return faces
+
+
+# -----------------------------
+# Gallery
+# -----------------------------
+class Gallery:
+    def __init__(self, faces, labels, names):
+        self.faces = faces          # (N, 128, 128) uint8, or (N, D) float32 embeddings
+        self.labels = labels        # (N,) int
+        self.names = names          # {label: person name}
+
+    @property
+    def trainset(self):
+        # Flattened faces with the label as the last column, as knn() expects
+        face_labels = self.labels.reshape((-1, 1)).astype(np.float64)
+        return np.concatenate((self.faces.reshape(len(self.faces), -1), face_labels), axis=1)
+
+    def __len__(self):
+        return len(self.faces)
+
+
+def load_gallery(path=dataset_path, verbose=True):
+    faces, labels, names = [], [], {}
+    for class_id, file in enumerate(sorted(Path(path).glob("*.npy"))):
+        names[class_id] = file.stem
+        if verbose:
+            print(" Loaded:", file.name)
+        data_item = np.load(file)
+        faces.append(data_item.reshape((data_item.shape[0],) + FACE_SIZE))
+        labels.append(np.full(data_item.shape[0], class_id, dtype=np.int32))
+    if not faces:
+        return None
+    return Gallery(np.concatenate(faces, axis=0), np.concatenate(labels, axis=0), names)
+
+
+# -----------------------------
+# Recognition
+# -----------------------------
+def train_lbph(gallery):
+    # No built-in threshold: predict() always reports the nearest person and
+    # FaceRecognizer decides on unknowns with the calibrated thresholds.
+    lbph = cv2.face.LBPHFaceRecognizer_create(
+        radius=1,        # Slightly larger radius for lighting robustness
+        neighbors=8,
+        grid_x=8,
+        grid_y=8,
+    )
+    # Gallery faces are stored already normalized (see preprocess.py)
+    lbph.train(list(gallery.faces), gallery.labels)
+    return lbph
+
+
+def chisqr_alt(probe, hists):
+    # cv2.HISTCMP_CHISQR_ALT, the distance LBPH predict() reports
+    total = hists + probe
+    diff = hists - probe
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 2 * np.where(total > 0, diff * diff / total, 0).sum(axis=1)
+
+
+class FaceRecognizer:
+    """Nearest-person matching with per-person unknown thresholds.
+
+    backend "lbph" and "knn" work on the normalized grayscale samples;
+    "lbp"/"lbp-hellinger" expect a gallery of LBP histograms (lbp.py) and
+    the normalized face; "embed" expects a gallery of embeddings
+    (face_embedding) and is given the colour crop instead, see prepare().
+    """
+
+    def __init__(self, gallery, backend="lbph", calibration=None, far=FAR_TARGET, embedder=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown recognizer backend {backend!r}")
+        self.gallery = gallery
+        self.names = gallery.names
+        self.backend = backend
+        if backend == "lbph":
+            self.lbph = train_lbph(gallery)
+        elif backend == "knn":
+            self.trainset = gallery.trainset
+        elif backend == "embed":
+            from face_embedding import FaceEmbedder
+            self.embedder = embedder or FaceEmbedder()
+        self.far = far
+        self.calibration = None
+        self.thresholds = {}
+        self.version = 0            # FaceCatalog version the gallery reflects
+        self.prototypes = None      # (per person, method) when compacted, see compact_gallery
+        if calibration is not None:
+            self.set_calibration(calibration, far)
+
+    def prepare(self, face_section, preprocess):
+        """What identify() takes for a detected crop."""
+        if self.backend == "embed":
+            return face_section
+        return preprocess(face_section)
+
+    def _add_samples(self, faces, label):
+        g = self.gallery
+        g.faces = np.concatenate((g.faces, faces), axis=0)
+        g.labels = np.concatenate((g.labels, np.full(len(faces), label, dtype=np.int32)))
+        if self.backend == "lbph":
+            self.lbph.update(list(faces), np.full(len(faces), label, dtype=np.int32))
+        elif self.backend == "knn":
+            self.trainset = g.trainset
+
+    def apply_changes(self, changes, path=dataset_path):
+        """Apply FaceCatalog.changes_since(self.version) in place.
+
+        Renames and new people are cheap (LBPH update() adds histograms);
+        returns False when samples were removed or replaced, or a compacted
+        gallery gains a person, and the recognizer has to be rebuilt instead.
+        """
+        labels = {name: label for label, name in self.names.items()}
+        for version, name, action, detail in changes:
+            if action == "rename" and detail in labels:
+                label = labels.pop(detail)
+                labels[name] = label
+                self.names[label] = name
+                if detail in self.thresholds:
+                    self.thresholds[name] = self.thresholds.pop(detail)
+            elif action == "add" and name not in labels and self.prototypes is None:
+                label = max(self.names, default=-1) + 1
+                if self.backend == "embed":
+                    from face_embedding import person_embeddings
+                    self._add_samples(person_embeddings(path, name, self.embedder), label)
+                elif self.backend in ("lbp", "lbp-hellinger"):
+                    from lbp import person_features
+                    self._add_samples(person_features(path, name, self.backend), label)
+                else:
+                    faces = np.load(Path(path) / f"{name}.npy")
+                    self._add_samples(faces.reshape((len(faces),) + FACE_SIZE), label)
+                self.names[label] = name
+                labels[name] = label
+            else:
+                return False
+            self.version = version
+        return True
+
+    def set_calibration(self, calibration, far=FAR_TARGET):
+        self.far = far
+        self.calibration = calibration
+        self.thresholds = thresholds_for(calibration, far)
+
+    def identify(self, face_section):
+        """Return (name, distance); lower distance is a closer match.
+
+        The nearest person is only accepted within their calibrated
+        threshold, anything further away is "Unknown".
+        """
+        if self.backend == "lbph":
+            label, dist = self.lbph.predict(face_section)
+        elif self.backend == "knn":
+            label, dist = knn(self.trainset, face_section.flatten(), k=KNN_K, return_distance=True)
+        elif self.backend == "embed":
+            similarity = self.gallery.faces @ self.embedder.embed([face_section])[0]
+            best = int(np.argmax(similarity))
+            label, dist = self.gallery.labels[best], 1.0 - float(similarity[best])
+        else:
+            return self.identify_batch([face_section])[0]
+        return self._decide(label, dist)
+
+    def identify_batch(self, faces):
+        """identify() for several faces; the LBP backends match them all in one go."""
+        if self.backend not in ("lbp", "lbp-hellinger"):
+            return [self.identify(face) for face in faces]
+        if not len(faces):
+            return []
+        from lbp import lbp_features, match
+        dist = match(lbp_features(np.asarray(faces), self.backend), self.gallery.faces, self.backend)
+        best = dist.argmin(axis=1)
+        return [self._decide(self.gallery.labels[b], float(d[b])) for b, d in zip(best, dist)]
+
+    def _decide(self, label, dist):
+        name = self.names.get(int(label))
+        threshold = self.thresholds.get(name, self.default_threshold())
+        if name is None or (threshold is not None and dist > threshold):
+            return "Unknown", dist
+        return name, dist
+
+    def predict(self, face_section):
+        return self.identify(face_section)[0]
+
+    def default_threshold(self):
+        # Until the gallery is calibrated; "lbp" reports the same distance as LBPH
+        return {"lbph": LBPH_THRESHOLD, "lbp": LBPH_THRESHOLD, "embed": EMBED_THRESHOLD}.get(self.backend)
+
+    def confidence(self, name, distance):
+        """Vote weight in [0.5, 1]: how far inside the person's threshold the match is."""
+        threshold = self.thresholds.get(name, self.default_threshold())
+        if name == "Unknown" or not threshold:
+            return 0.5
+        return 0.5 + 0.5 * max(0.0, 1.0 - distance / threshold)
+
+    def features(self):
+        if self.backend == "lbph":
+            return np.asarray(self.lbph.getHistograms(), dtype=np.float32).reshape(len(self.gallery), -1)
+        return self.gallery.faces.reshape(len(self.gallery), -1).astype(np.float32)
+
+    def distances(self, probe, features):
+        if self.backend in ("lbph", "lbp"):
+            return chisqr_alt(probe, features)
+        if self.backend == "lbp-hellinger":
+            return np.sqrt(np.clip(1.0 - features @ probe, 0.0, None))
+        if self.backend == "embed":
+            return 1.0 - features @ probe
+        return np.sqrt(((features - probe) ** 2).sum(axis=1))
+
+    def person_distance(self, distances):
+        # How identify() scores one person: nearest sample for LBPH and
+        # embeddings, knn_score() for KNN
+        if self.backend == "knn":
+            return knn_score(distances)
+        return float(distances.min())
+
+
+# -----------------------------
+# Unknown rejection
+# -----------------------------
+def calibrate(recognizer, probes=CALIBRATION_PROBES, gap=CALIBRATION_GAP, seed=0, members=None):
+    """Genuine and impostor distances per person, from held-out gallery samples.
+
+    Each probe is scored against every person without itself and its
+    neighbouring frames. Its own person's score is a genuine distance; the
+    others' are impostor distances, standing in for strangers. `members`
+    (a boolean mask) limits the matched samples, e.g. to the prototypes
+    of a compacted gallery, while probes still come from every sample.
+    """
+    gallery = recognizer.gallery
+    features = recognizer.features()
+    labels = gallery.labels
+    index = np.arange(len(gallery))
+    rng = np.random.default_rng(seed)
+    stats = {name: {"genuine": [], "impostor": []} for name in gallery.names.values()}
+
+    for label, name in gallery.names.items():
+        own = index[labels == label]
+        for i in rng.choice(own, size=min(probes, len(own)), replace=False):
+            dist = recognizer.distances(features[i], features)
+            keep = (labels != label) | (np.abs(index - i) > gap)
+            if members is not None:
+                keep &= members
+            for other, other_name in gallery.names.items():
+                mask = keep & (labels == other)
+                if mask.any():
+                    kind = "genuine" if other == label else "impostor"
+                    stats[other_name][kind].append(recognizer.person_distance(dist[mask]))
+    return stats
+
+
+def thresholds_for(stats, far=FAR_TARGET):
+    """Per-person distance thresholds accepting about `far` of impostors."""
+    thresholds = {}
+    for name, s in stats.items():
+        if s["impostor"]:
+            thresholds[name] = float(np.quantile(s["impostor"], far))
+        elif s["genuine"]:
+            # Only one person enrolled: nothing to reject against, stay near
+            # their own spread
+            genuine = np.asarray(s["genuine"])
+            thresholds[name] = float(genuine.mean() + 3 * genuine.std())
+    return thresholds
+
+
+def calibration_report(stats, thresholds):
+    """{name: (threshold, false reject rate, false accept rate)} on the calibration data."""
+    report = {}
+    for name, t in thresholds.items():
+        genuine, impostor = np.asarray(stats[name]["genuine"]), np.asarray(stats[name]["impostor"])
+        frr = float((genuine > t).mean()) if len(genuine) else None
+        far = float((impostor <= t).mean()) if len(impostor) else None
+        report[name] = (t, frr, far)
+    return report
+
+
+def gallery_signature(gallery, path=dataset_path):
+    """Cached results derived from a gallery are keyed by it.
+
+    Each person's catalog checksum and sample count, plus the preprocessing
+    config: re-enrolling someone with as many samples as before, or turning
+    CLAHE or alignment on, still changes it.
+    """
+    with FaceCatalog(path) as catalog:
+        checksums = {row["name"]: row["checksum"] for row in catalog.people()}
+    people = {name: [checksums.get(name), int((gallery.labels == label).sum())]
+              for label, name in gallery.names.items()}
+    return {"people": people, "preprocess": load_config(path)}
+
+
+def load_calibration(recognizer, path=dataset_path, members=None, variant=None):
+    """Cached calibration for this gallery and backend, recomputed when the gallery changed.
+
+    `members` and `variant` calibrate a compacted gallery: the samples kept
+    and the name its result is cached under.
+    """
+    gallery = recognizer.gallery
+    file = Path(path) / CALIBRATION_FILE
+    signature = gallery_signature(gallery, path)
+    saved = {}
+    if file.exists():
+        try:
+            saved = json.loads(file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            saved = {}
+    if saved.get("gallery") != signature:
+        saved = {"gallery": signature, "backends": {}}
+    key = f"{recognizer.backend}/{variant}" if variant else recognizer.backend
+    if key not in saved["backends"]:
+        saved["backends"][key] = calibrate(recognizer, members=members)
+        try:
+            file.write_text(json.dumps(saved), encoding="utf-8")
+        except OSError as e:
+            print(f"Could not save calibration: {e}")
+    return saved["backends"][key]
+
+
+def load_backend_gallery(path=dataset_path, backend="lbph", verbose=True, embedder=None):
+    """Grayscale samples for lbph/knn, embeddings for embed, histograms for lbp."""
+    if backend == "embed":
+        from face_embedding import load_embedding_gallery
+        return load_embedding_gallery(path, embedder, verbose=verbose)
+    if backend in ("lbp", "lbp-hellinger"):
+        from lbp import load_histogram_gallery
+        return load_histogram_gallery(path, backend, verbose=verbose)
+    return load_gallery(path, verbose=verbose)
+
+
+def load_recognizer(path=dataset_path, backend="lbph", far=FAR_TARGET, verbose=True, prototypes=None):
+    """Gallery + calibrated recognizer, or None when nothing is enrolled.
+
+    prototypes=(per person, method) matches against a compacted gallery
+    instead of every sample (compact_gallery.py).
+    """
+    with FaceCatalog(path) as catalog:
+        version = catalog.version()
+    embedder = None
+    if backend == "embed":
+        from face_embedding import FaceEmbedder
+        embedder = FaceEmbedder()
+    gallery = load_backend_gallery(path, backend, verbose, embedder)
+    if gallery is None:
+        return None
+    recognizer = FaceRecognizer(gallery, backend=backend, embedder=embedder)
+    recognizer.version = version
+    if prototypes:
+        from compact_gallery import compact_recognizer
+        return compact_recognizer(recognizer, *prototypes, path=path, far=far)
+    recognizer.set_calibration(load_calibration(recognizer, path), far)
+    return recognizer
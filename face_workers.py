@@ -0,0 +1,179 @@
+import multiprocessing as mp
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from face_pipeline import load_detector, detect_faces, load_recognizer
+from preprocess import load_preprocessor
+from tracking import iou, IOU_THRESHOLD
+
+# Set in the parent before the pool forks, so every worker reads the same
+# gallery and trained recognizer through copy-on-write pages.
+_recognizer = None
+
+# Per-worker state
+_net = None
+_preprocess = None
+_attached = {}
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _init_worker(gallery_path, backend, far, prototypes=None):
+    global _net, _preprocess, _recognizer
+    cv2.setNumThreads(1)        # the pool already uses one process per core
+    _net = load_detector()
+    _preprocess = load_preprocessor(gallery_path)
+    if _recognizer is not None and _recognizer.backend == "embed":
+        # A dnn net is not safe to share across fork; give each worker its own
+        from face_embedding import FaceEmbedder
+        _recognizer.embedder = FaceEmbedder()
+    if _recognizer is None:
+        # spawn start method (Windows/macOS): nothing was inherited, build a copy
+        _recognizer = load_recognizer(gallery_path, backend=backend, far=far, verbose=False,
+                                      prototypes=prototypes)
+
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is None:
+        try:
+            # The parent owns the segment; don't let this worker's tracker unlink it
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:   # Python < 3.13
+            shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+
+def _process(slot_name, shape, skip=()):
+    shm = _attach(slot_name)
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+    t0 = time.perf_counter()
+    faces = detect_faces(_net, frame)
+    t1 = time.perf_counter()
+    results, pending = [], []
+    for x1, y1, x2, y2, confidence in faces:
+        results.append((x1, y1, x2, y2, confidence, None, None))
+        if any(iou((x1, y1, x2, y2), box) >= IOU_THRESHOLD for box in skip):
+            # Already identified on an earlier frame
+            continue
+        # prepare() reuses its buffer; keep a copy for the batch
+        pending.append((len(results) - 1, _recognizer.prepare(frame[y1:y2, x1:x2], _preprocess).copy()))
+    timings = {"detect": t1 - t0}
+    if pending:
+        t2 = time.perf_counter()
+        matches = _recognizer.identify_batch([face for _, face in pending])
+        timings["preprocess"] = t2 - t1
+        timings["recognize"] = time.perf_counter() - t2
+        for (i, _), (name, dist) in zip(pending, matches):
+            results[i] = results[i][:5] + (name, float(dist))
+    return results, timings
+
+
+class _Slot:
+    def __init__(self, shape):
+        self.shape = shape
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        self.busy = False
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class RecognitionPool:
+    """Detection + recognition for several cameras on one process pool.
+
+    Frames travel to the workers through shared-memory slots (two per camera)
+    rather than being pickled. When a camera's slots are all busy, submit()
+    returns False and the caller drops the frame, so a slow pool sheds load
+    instead of building latency.
+    """
+
+    def __init__(self, recognizer, gallery_path, far=None, workers=None, slots_per_camera=2):
+        global _recognizer
+        self.workers = workers or available_cores()
+        self.slots_per_camera = slots_per_camera
+        self._slots = {}
+        self._lock = threading.Lock()
+
+        if "fork" in mp.get_all_start_methods():
+            # Parent-side OpenCV threads don't survive fork; keep the parent
+            # single-threaded, the heavy work happens in the workers anyway.
+            cv2.setNumThreads(1)
+            _recognizer = recognizer
+            ctx = mp.get_context("fork")
+        else:
+            ctx = mp.get_context("spawn")
+        self.pool = ctx.Pool(self.workers, initializer=_init_worker,
+                             initargs=(str(gallery_path), recognizer.backend, far or recognizer.far,
+                                       recognizer.prototypes))
+
+    def submit(self, camera, frame, callback, skip=()):
+        """Queue `frame`; callback(results, timings) runs on the pool's result thread.
+
+        Faces overlapping a box in `skip` are detected but not recognised,
+        their name and distance come back as None.
+        """
+        frame = np.ascontiguousarray(frame)
+        slot = self._acquire(camera, frame.shape)
+        if slot is None:
+            return False
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=slot.shm.buf)[...] = frame
+
+        def done(result):
+            try:
+                callback(*result)
+            finally:
+                slot.busy = False
+
+        def failed(error):
+            slot.busy = False
+            print(f"Recognition worker failed on {camera}: {error}")
+
+        self.pool.apply_async(_process, (slot.shm.name, frame.shape, list(skip)),
+                              callback=done, error_callback=failed)
+        return True
+
+    def _acquire(self, camera, shape):
+        with self._lock:
+            slots = self._slots.setdefault(camera, [])
+            for slot in slots:
+                if not slot.busy and slot.shape == shape:
+                    slot.busy = True
+                    return slot
+            # Resolution changed: retire idle slots of the old size
+            for slot in [s for s in slots if not s.busy and s.shape != shape]:
+                slot.close()
+                slots.remove(slot)
+            if len(slots) < self.slots_per_camera:
+                slot = _Slot(shape)
+                slot.busy = True
+                slots.append(slot)
+                return slot
+        return None
+
+    def pending(self):
+        """Frames submitted but not yet answered."""
+        with self._lock:
+            return sum(slot.busy for slots in self._slots.values() for slot in slots)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        with self._lock:
+            for slots in self._slots.values():
+                for slot in slots:
+                    slot.close()
+            self._slots = {}
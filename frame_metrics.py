@@ -0,0 +1,120 @@
+import json
+import socket
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+class FrameMetrics:
+    """Rolling per-stage timings, FPS and dropped-frame counts for a camera loop.
+
+    Timings are kept for the last `window` frames, so percentiles follow what
+    the loop is doing now. With a `log_path`, a JSON summary line is appended
+    every `log_every` seconds and tagged with the robot's host name, which
+    makes logs from different robots comparable.
+    """
+
+    def __init__(self, source="camera", window=120, log_path=None, log_every=30.0, robot_id=None):
+        self.source = source
+        self.window = window
+        self.log_path = Path(log_path) if log_path else None
+        self.log_every = log_every
+        self.robot_id = robot_id or socket.gethostname()
+
+        self.stages = {}
+        self.frame_times = deque(maxlen=window)
+        self.frames = 0
+        self.dropped = 0
+        self.skipped = 0
+        self._started = time.perf_counter()
+        self._last_log = self._started
+        if self.log_path:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        samples = self.stages.get(name)
+        if samples is None:
+            samples = self.stages[name] = deque(maxlen=self.window)
+        samples.append(seconds * 1000)
+
+    def frame_done(self):
+        now = time.perf_counter()
+        self.frame_times.append(now)
+        self.frames += 1
+        if self.log_path and now - self._last_log >= self.log_every:
+            self.write_summary(now)
+
+    def drop(self):
+        # Camera read failed or timed out
+        self.dropped += 1
+
+    def skip(self):
+        # Frame read fine but deliberately not processed
+        self.skipped += 1
+
+    def fps(self):
+        if len(self.frame_times) < 2:
+            return 0.0
+        span = self.frame_times[-1] - self.frame_times[0]
+        return (len(self.frame_times) - 1) / span if span > 0 else 0.0
+
+    def percentiles(self, name, qs=(50, 95)):
+        samples = self.stages.get(name)
+        if not samples:
+            return tuple(0.0 for _ in qs)
+        return tuple(float(v) for v in np.percentile(np.fromiter(samples, dtype=np.float64), qs))
+
+    def summary(self):
+        stages = {}
+        for name in self.stages:
+            p50, p95 = self.percentiles(name)
+            stages[name] = {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2)}
+        return {
+            "robot": self.robot_id,
+            "source": self.source,
+            "time": time.time(),
+            "uptime_s": round(time.perf_counter() - self._started, 1),
+            "fps": round(self.fps(), 2),
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "stages": stages,
+        }
+
+    def write_summary(self, now=None):
+        self._last_log = now or time.perf_counter()
+        if not self.log_path:
+            return
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.summary()) + "\n")
+
+    def draw_overlay(self, frame, origin=(10, None)):
+        lines = [f"FPS {self.fps():5.1f}  dropped {self.dropped}  skipped {self.skipped}"]
+        for name in self.stages:
+            p50, p95 = self.percentiles(name)
+            lines.append(f"{name:<10} p50 {p50:6.1f} ms  p95 {p95:6.1f} ms")
+
+        line_h = 18
+        x = origin[0]
+        # Default to the bottom-left corner so it doesn't cover the face labels
+        y = origin[1] if origin[1] is not None else frame.shape[0] - line_h * len(lines) - 10
+        width = 8 + 9 * max(len(line) for line in lines)
+        overlay = frame.copy()
+        cv2.rectangle(overlay, (x - 5, y - 5), (x + width, y + line_h * len(lines)), (0, 0, 0), -1)
+        cv2.addWeighted(overlay, 0.5, frame, 0.5, 0, dst=frame)
+        for i, line in enumerate(lines):
+            cv2.putText(frame, line, (x, y + 13 + i * line_h), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.45, (0, 255, 0), 1, cv2.LINE_AA)
+        return frame
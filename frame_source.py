@@ -0,0 +1,233 @@
+import threading
+import time
+from pathlib import Path
+
+import cv2
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def parse_source(spec):
+    """Map a --source value to ("device", index), ("images", folder) or ("file", path)."""
+    if isinstance(spec, int):
+        return "device", spec
+    spec = str(spec)
+    if spec.isdigit():
+        return "device", int(spec)
+    if Path(spec).is_dir():
+        return "images", Path(spec)
+    return "file", spec
+
+
+class FrameSource:
+    """cv2.VideoCapture-like reader for a camera, a video file or an image folder.
+
+    Cameras are read on a background thread that always keeps only the newest
+    frame, so read() never hands out a frame that sat in a driver queue. If no
+    new frame arrives within `read_timeout`, read() returns (False, None), and
+    after `max_failures` such misses in a row the device is reopened. Each
+    grabber owns its VideoCapture and releases it when it exits, so a read
+    stuck in the driver never races a release or a newer grabber. Files
+    and folders are read in order; `finished` becomes True at the end.
+    """
+
+    def __init__(self, source=0, width=None, height=None, fps=None, fourcc="MJPG",
+                 buffer_size=1, read_timeout=2.0, reconnect=True, max_failures=3, loop=False):
+        self.kind, self.target = parse_source(source)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fourcc = fourcc
+        self.buffer_size = buffer_size
+        self.read_timeout = read_timeout
+        self.reconnect = reconnect
+        self.max_failures = max_failures
+        self.loop = loop
+
+        self.finished = False
+        self.reconnects = 0
+        self.stale_frames = 0       # camera frames replaced before anyone read them
+        self._cap = None
+        self._images = []
+        self._image_pos = 0
+        self._failures = 0
+
+        self._cond = threading.Condition()
+        self._latest = None
+        self._latest_seq = 0
+        self._read_seq = 0
+        self._grabber = None
+        self._stop = None           # set to end the current grabber
+
+        self.open()
+
+    @property
+    def name(self):
+        return f"camera {self.target}" if self.kind == "device" else str(self.target)
+
+    # ---------- open / close ----------
+    def open(self):
+        if self.kind == "images":
+            self._images = sorted(p for p in self.target.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+            self._image_pos = 0
+            return bool(self._images)
+
+        cap = cv2.VideoCapture(self.target)
+        self._cap = cap
+        if self.kind == "device" and cap.isOpened():
+            self._configure(cap)
+            self._stop = threading.Event()
+            self._grabber = threading.Thread(target=self._grab_loop, args=(cap, self._stop),
+                                             name=f"grab-{self.target}", daemon=True)
+            self._grabber.start()
+        return cap.isOpened()
+
+    def _configure(self, cap):
+        # FOURCC has to go first: many UVC cameras only offer high
+        # resolutions or frame rates in MJPG.
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        if self.width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            cap.set(cv2.CAP_PROP_FPS, self.fps)
+        if self.buffer_size is not None:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+
+    def isOpened(self):
+        if self.kind == "images":
+            return bool(self._images)
+        return self._cap is not None and self._cap.isOpened()
+
+    def release(self):
+        cap, self._cap = self._cap, None
+        if self._grabber is None:
+            if cap is not None:
+                cap.release()
+            return
+        with self._cond:
+            self._stop.set()
+            self._cond.notify_all()
+        # The grabber releases its own capture once its read returns
+        self._grabber.join(timeout=self.read_timeout)
+        if self._grabber.is_alive():
+            print(f"{self.name}: a read is stuck in the driver, leaving it to finish")
+        self._grabber = None
+
+    def properties(self):
+        if self._cap is None:
+            return {}
+        fourcc = int(self._cap.get(cv2.CAP_PROP_FOURCC))
+        return {
+            "width": int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": self._cap.get(cv2.CAP_PROP_FPS),
+            "fourcc": "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)),
+            "buffer_size": int(self._cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def __iter__(self):
+        while not self.finished:
+            ret, frame = self.read()
+            if ret:
+                yield frame
+
+    # ---------- reading ----------
+    def read(self):
+        if self.kind == "images":
+            return self._read_image()
+        if self.kind == "file":
+            return self._read_file()
+        return self._read_device()
+
+    def _read_image(self):
+        while self._image_pos < len(self._images):
+            path = self._images[self._image_pos]
+            self._image_pos += 1
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                return True, frame
+        if self.loop and self._images:
+            self._image_pos = 0
+            return self._read_image()
+        self.finished = True
+        return False, None
+
+    def _read_file(self):
+        ret, frame = self._cap.read()
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read()
+        if not ret:
+            self.finished = True
+        return ret, frame
+
+    def _grab_loop(self, cap, stop):
+        try:
+            while not stop.is_set() and self._cap is cap:
+                ret, frame = cap.read()
+                if not ret:
+                    time.sleep(0.01)
+                    continue
+                with self._cond:
+                    if stop.is_set():
+                        break       # released while this read was in progress
+                    if self._latest_seq > self._read_seq:
+                        self.stale_frames += 1
+                    self._latest = frame
+                    self._latest_seq += 1
+                    self._cond.notify_all()
+        finally:
+            cap.release()
+
+    def _read_device(self):
+        with self._cond:
+            stop = self._stop
+            got = self._cond.wait_for(lambda: self._latest_seq > self._read_seq or stop is None or stop.is_set(),
+                                      self.read_timeout)
+            if got and self._latest_seq > self._read_seq:
+                self._read_seq = self._latest_seq
+                self._failures = 0
+                return True, self._latest
+
+        self._failures += 1
+        if self.reconnect and self._failures >= self.max_failures:
+            self._reopen()
+        return False, None
+
+    def _reopen(self):
+        print(f"No frames from {self.name} for {self._failures * self.read_timeout:.0f}s, reconnecting...")
+        self.release()
+        time.sleep(min(5.0, 0.5 * 2 ** min(self.reconnects, 3)))
+        self.reconnects += 1
+        self._failures = 0
+        self.open()
+
+
+def add_source_arguments(parser, default_source="0", multiple=False):
+    if multiple:
+        parser.add_argument("--source", nargs="+", default=[default_source],
+                            help="one or more camera indexes, video files or image folders")
+    else:
+        parser.add_argument("--source", default=default_source,
+                            help="camera index, video file or folder of images (default: %(default)s)")
+    parser.add_argument("--width", type=int, help="capture width")
+    parser.add_argument("--height", type=int, help="capture height")
+    parser.add_argument("--fps", type=float, help="capture frame rate")
+    parser.add_argument("--fourcc", default="MJPG", help="camera pixel format, '' to keep the driver default")
+    parser.add_argument("--buffer-size", type=int, default=1, help="driver frame queue length")
+    parser.add_argument("--read-timeout", type=float, default=2.0, help="seconds to wait for a camera frame")
+
+
+def source_from_args(args, source=None):
+    return FrameSource(args.source if source is None else source, width=args.width, height=args.height,
+                       fps=args.fps, fourcc=args.fourcc or None, buffer_size=args.buffer_size,
+                       read_timeout=args.read_timeout)
@@ -0,0 +1,161 @@
+"""LBP histograms in NumPy, the features cv2.face.LBPHFaceRecognizer uses.
+
+Same operator as OpenCV's LBPH (radius 1, 8 bilinear-interpolated circular
+neighbours, a bit set when the neighbour is >= the centre) and the same
+spatial histograms (8x8 grid, 256 bins per cell, each cell normalized), but
+computed for a whole stack of faces at once and kept as a plain float32
+matrix, so many probes are matched in one vectorized call:
+
+    lbp            chi-square (HISTCMP_CHISQR_ALT), LBPH's own distance;
+                   thresholds carry over from the "lbph" backend
+    lbp-hellinger  Hellinger distance on square-rooted histograms, a single
+                   matrix product per batch
+
+Histograms are kept per person in data/lbp/<name>.npy next to the samples,
+like the embeddings, and follow the catalog's renames, merges and deletes.
+"""
+from pathlib import Path
+
+import numpy as np
+
+from face_pipeline import Gallery, dataset_path
+
+LBP_RADIUS = 1
+LBP_NEIGHBORS = 8
+LBP_GRID = (8, 8)
+LBP_BACKENDS = ("lbp", "lbp-hellinger")
+HISTOGRAMS_DIR = "lbp"
+LBP_BATCH = 256                 # faces per lbp_histograms() pass
+MATCH_BLOCK_BYTES = 32 << 20    # chi-square working memory per block
+
+
+def lbp_codes(faces, radius=LBP_RADIUS, neighbors=LBP_NEIGHBORS):
+    """(N, H - 2r, W - 2r) LBP codes for a stack of grayscale faces, as OpenCV's elbp()."""
+    src = np.asarray(faces, dtype=np.float32)
+    if src.ndim == 2:
+        src = src[None]
+    _, h, w = src.shape
+    r = radius
+    center = src[:, r:h - r, r:w - r]
+    codes = np.zeros(center.shape, dtype=np.int32)
+    eps = np.finfo(np.float32).eps
+
+    def shifted(dy, dx):
+        return src[:, r + dy:h - r + dy, r + dx:w - r + dx]
+
+    for n in range(neighbors):
+        x = r * np.cos(2.0 * np.pi * n / neighbors)
+        y = -r * np.sin(2.0 * np.pi * n / neighbors)
+        fx, fy, cx, cy = int(np.floor(x)), int(np.floor(y)), int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = np.float32(x - fx), np.float32(y - fy)
+        t = ((1 - tx) * (1 - ty) * shifted(fy, fx) + tx * (1 - ty) * shifted(fy, cx)
+             + (1 - tx) * ty * shifted(cy, fx) + tx * ty * shifted(cy, cx))
+        codes |= ((t > center) | (np.abs(t - center) < eps)).astype(np.int32) << n
+    return codes
+
+
+def lbp_histograms(faces, radius=LBP_RADIUS, neighbors=LBP_NEIGHBORS, grid=LBP_GRID):
+    """(N, grid cells * 2**neighbors) float32 spatial histograms, as LBPH's getHistograms()."""
+    faces = np.asarray(faces)
+    if faces.ndim == 2:
+        faces = faces[None]
+    gx, gy = grid
+    bins = 2 ** neighbors
+    out = np.empty((len(faces), gx * gy * bins), dtype=np.float32)
+    for start in range(0, len(faces), LBP_BATCH):
+        codes = lbp_codes(faces[start:start + LBP_BATCH], radius, neighbors)
+        n, h, w = codes.shape
+        ch, cw = h // gy, w // gx      # like OpenCV, leftover rows/columns are dropped
+        cells = (codes[:, :gy * ch, :gx * cw]
+                 .reshape(n, gy, ch, gx, cw).transpose(0, 1, 3, 2, 4).reshape(n, gy * gx, ch * cw))
+        # One bincount for the whole batch: offset each cell into its own bin range
+        offsets = (np.arange(n * gy * gx) * bins).reshape(n, gy * gx, 1)
+        counts = np.bincount((cells + offsets).ravel(), minlength=n * gy * gx * bins)
+        out[start:start + n] = counts.reshape(n, -1) / np.float32(ch * cw)
+    return out
+
+
+def root_histograms(histograms):
+    """Square-rooted, unit-norm histograms: Hellinger matching becomes a dot product."""
+    return np.sqrt(histograms / histograms.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+def lbp_features(faces, backend="lbp"):
+    """What the gallery of `backend` holds, for a stack of normalized faces."""
+    histograms = lbp_histograms(faces)
+    return root_histograms(histograms) if backend == "lbp-hellinger" else histograms
+
+
+def chi_square(probes, gallery):
+    """(M, N) HISTCMP_CHISQR_ALT distances, 2 * sum((a - b)^2 / (a + b))."""
+    probes = np.atleast_2d(probes).astype(np.float32, copy=False)
+    out = np.empty((len(probes), len(gallery)), dtype=np.float32)
+    # Blocks of probe x gallery pairs, so memory stays bounded for big galleries
+    pairs = max(1, MATCH_BLOCK_BYTES // (4 * probes.shape[1]))
+    gstep = max(1, min(len(gallery), pairs))
+    pstep = max(1, pairs // gstep)
+    for i in range(0, len(probes), pstep):
+        p = probes[i:i + pstep, None, :]
+        for j in range(0, len(gallery), gstep):
+            g = gallery[None, j:j + gstep, :]
+            total = p + g
+            diff = p - g
+            np.square(diff, out=diff)
+            # Both bins are empty where total is 0, so diff is already 0 there
+            np.divide(diff, total, out=diff, where=total > 0)
+            out[i:i + pstep, j:j + gstep] = 2 * diff.sum(axis=2)
+    return out
+
+
+def hellinger(probes, gallery):
+    """(M, N) Hellinger distances between root_histograms() rows."""
+    probes = np.atleast_2d(probes).astype(np.float32, copy=False)
+    return np.sqrt(np.clip(1.0 - probes @ gallery.T, 0.0, None))
+
+
+def match(probes, gallery, backend="lbp"):
+    return hellinger(probes, gallery) if backend == "lbp-hellinger" else chi_square(probes, gallery)
+
+
+# -----------------------------
+# Per-person store
+# -----------------------------
+def histograms_file(path, name):
+    return Path(path) / HISTOGRAMS_DIR / f"{name}.npy"
+
+
+def person_histograms(path, name):
+    """Stored histograms for `name`, recomputed when the samples are newer."""
+    samples_file = Path(path) / f"{name}.npy"
+    file = histograms_file(path, name)
+    if file.exists() and file.stat().st_mtime >= samples_file.stat().st_mtime:
+        return np.load(file)
+    histograms = lbp_histograms(np.load(samples_file))
+    file.parent.mkdir(exist_ok=True)
+    np.save(file, histograms)
+    return histograms
+
+
+def person_features(path, name, backend="lbp"):
+    histograms = person_histograms(path, name)
+    return root_histograms(histograms) if backend == "lbp-hellinger" else histograms
+
+
+def load_histogram_gallery(path=dataset_path, backend="lbp", verbose=True):
+    """Gallery whose faces are LBP features, same people and labels as load_gallery()."""
+    features, labels, names = [], [], {}
+    for class_id, file in enumerate(sorted(Path(path).glob("*.npy"))):
+        names[class_id] = file.stem
+        if verbose:
+            print(" Loaded:", file.name)
+        data_item = person_features(path, file.stem, backend)
+        features.append(data_item)
+        labels.append(np.full(len(data_item), class_id, dtype=np.int32))
+    if not features:
+        return None
+    return Gallery(np.concatenate(features, axis=0), np.concatenate(labels, axis=0), names)
+
+
+def histogram_gallery(gallery, backend="lbp"):
+    """LBP gallery from a gallery of grayscale faces (benchmarks, synthetic data)."""
+    return Gallery(lbp_features(gallery.faces, backend), gallery.labels, gallery.names)
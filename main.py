@@ -1,15 +1,18 @@
 import sys
 import os
 import subprocess
+import sqlite3
 from pathlib import Path
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTextEdit,
     QScrollArea, QFrame, QSpacerItem, QSizePolicy, QGraphicsOpacityEffect,
-    QMessageBox, QInputDialog, QGridLayout
+    QMessageBox, QInputDialog, QGridLayout, QDialog, QStackedWidget
 )
-from PyQt5.QtGui import QPixmap, QFontDatabase
+from PyQt5.QtGui import QPixmap, QPixmapCache, QFontDatabase
 from PyQt5.QtCore import Qt, QSize, QPropertyAnimation, QEasingCurve, QTimer, QCoreApplication
 import os
+from face_catalog import FaceCatalog, CatalogError
+from face_gallery import FaceGalleryDialog
 os.environ["QT_QPA_PLATFORM"] = "xcb"
 # =====================
 # --- Closable Widget ---
@@ -63,16 +66,38 @@ class ClosableWidget(QFrame):
         self.scroll_area.setWidget(self.content_widget)
         self.main_layout.addWidget(self.scroll_area)
 
+        # Panels are built once and kept; switching only changes the page
+        self.stack = QStackedWidget(self.content_widget)
+        self.stack.currentChanged.connect(self._fit_current_panel)
+        self.content_layout.addWidget(self.stack)
+        self.panels = {}
+
+        self.closing = False
+        self.hide_timer = QTimer(self)
+        self.hide_timer.setSingleShot(True)
+        self.hide_timer.timeout.connect(self.hide)
+
     def close_box(self):
+        self.closing = True
         self.animation.setStartValue(self.height())
         self.animation.setEndValue(0)
         self.animation.start()
         self.opacity_animation.setStartValue(1.0)
         self.opacity_animation.setEndValue(0.0)
         self.opacity_animation.start()
-        QTimer.singleShot(400, self.hide)
+        self.hide_timer.start(400)
 
     def show_box(self, desired_height=300):
+        if self.isVisible() and not self.closing:
+            # Already open: just grow or shrink to the new panel
+            if self.height() != desired_height:
+                self.animation.stop()
+                self.animation.setStartValue(self.height())
+                self.animation.setEndValue(desired_height)
+                self.animation.start()
+            return
+        self.closing = False
+        self.hide_timer.stop()
         self.show()
         self.animation.setStartValue(0)
         self.animation.setEndValue(desired_height)
@@ -81,12 +106,26 @@ class ClosableWidget(QFrame):
         self.opacity_animation.setEndValue(1.0)
         self.opacity_animation.start()
 
-    def set_content_widget(self, widget):
-        while self.content_layout.count():
-            item = self.content_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-        self.content_layout.addWidget(widget)
+    def panel(self, key, factory):
+        """The panel for `key`, built with factory() on first use."""
+        widget = self.panels.get(key)
+        if widget is None:
+            widget = self.panels[key] = factory()
+            self.stack.addWidget(widget)
+        return widget
+
+    def show_panel(self, key, factory, title, desired_height):
+        widget = self.panel(key, factory)
+        self.stack.setCurrentWidget(widget)
+        self.set_title(title)
+        self.show_box(desired_height)
+        return widget
+
+    def _fit_current_panel(self, index):
+        # A stack sizes to its largest page; let hidden pages shrink away
+        for i in range(self.stack.count()):
+            policy = QSizePolicy.Preferred if i == index else QSizePolicy.Ignored
+            self.stack.widget(i).setSizePolicy(policy, policy)
 
     def set_title(self, title):
         self.title_label.setText(title)
@@ -247,30 +286,55 @@ class FaceRecognitionWidget(QWidget):
         self._run_python_script(script)
 
     def manage_dataset(self):
-        base = self._get_app_dir()
-        folder = base / "data"
-        folder.mkdir(exist_ok=True)
-        files = [f.name for f in folder.glob("*.npy")]
-        if not files:
-            self.show_message("No Data", "No registered faces found in the 'data' folder.")
+        folder = self._get_app_dir() / "data"
+        try:
+            catalog = FaceCatalog(folder)
+        except (sqlite3.Error, OSError) as e:
+            self.show_message("Catalog Error", f"Could not open the face catalog:\n{e}", QMessageBox.Critical)
             return
 
-        file, ok = QInputDialog.getItem(self, "Manage Dataset", "Choose face data file to manage:", files, 0, False)
-        if ok and file:
-            choice, ok2 = QInputDialog.getItem(self, "Action", f"Choose an action for {file}:", ["Rename", "Delete"], 0, False)
-            if ok2:
+        with catalog:
+            people = catalog.people()
+            if not people:
+                self.show_message("No Data", "No registered faces found in the 'data' folder.")
+                return
+
+            picker = FaceGalleryDialog(folder, people, self)
+            if picker.exec_() != QDialog.Accepted or picker.selected_name() is None:
+                return
+            name = picker.selected_name()
+
+            choice, ok2 = QInputDialog.getItem(self, "Action", f"Choose an action for {name}:",
+                                               ["Rename", "Merge into...", "Delete"], 0, False)
+            if not ok2:
+                return
+            try:
                 if choice == "Rename":
-                    new_name, ok3 = QInputDialog.getText(self, "Rename", "Enter new name (no extension):")
+                    new_name, ok3 = QInputDialog.getText(self, "Rename", "Enter the new name:")
                     if ok3 and new_name.strip():
-                        os.rename(folder / file, folder / f"{new_name.strip()}.npy")
-                        self.show_message("Renamed", f"{file} renamed to {new_name.strip()}.npy")
+                        catalog.rename(name, new_name)
+                        self.show_message("Renamed", f"{name} renamed to {new_name.strip()}")
+                elif choice == "Merge into...":
+                    # Editable, so samples can also be moved to a new name
+                    others = [p["name"] for p in people if p["name"] != name]
+                    target, ok3 = QInputDialog.getItem(self, "Merge", f"Add {name}'s samples to:", others, 0, True)
+                    target = target.strip()
+                    if ok3 and target and target != name:
+                        confirm = QMessageBox.question(self, "Confirm Merge",
+                                                       f"Merge {name} into {target}? {name} will be removed.",
+                                                       QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+                        if confirm == QMessageBox.Yes:
+                            catalog.merge([name], target)
+                            self.show_message("Merged", f"{name} merged into {target}.")
                 elif choice == "Delete":
                     confirm = QMessageBox.question(self, "Confirm Deletion",
-                                                   f"Are you sure you want to delete {file}?",
+                                                   f"Are you sure you want to delete {name}?",
                                                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
                     if confirm == QMessageBox.Yes:
-                        os.remove(folder / file)
-                        self.show_message("Deleted", f"{file} deleted.")
+                        catalog.delete(name)
+                        self.show_message("Deleted", f"{name} deleted.")
+            except (CatalogError, sqlite3.Error, OSError) as e:
+                self.show_message("Failed", str(e), QMessageBox.Critical)
 
     def open_data_folder(self):
         folder = self._get_app_dir() / "data"
@@ -316,10 +380,8 @@ class BotGUI(QWidget):
         # Header
         header_layout = QVBoxLayout()
         header_layout.setAlignment(Qt.AlignCenter)
-        bot_icon_path = self.assets_dir / "aura_icon.jpg"
-        if bot_icon_path.exists():
-            pixmap = QPixmap(str(bot_icon_path))
-            scaled_pixmap = pixmap.scaled(QSize(400, 350), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        scaled_pixmap = self.header_pixmap()
+        if scaled_pixmap is not None:
             bot_label = QLabel()
             bot_label.setPixmap(scaled_pixmap)
             bot_label.setAlignment(Qt.AlignCenter)
@@ -356,17 +418,25 @@ class BotGUI(QWidget):
         self.setStyleSheet(self.get_stylesheet())
         self.show()
 
+    def header_pixmap(self, size=QSize(400, 350)):
+        # Scaled once and kept in Qt's pixmap cache
+        path = self.assets_dir / "aura_icon.jpg"
+        key = f"aura-header-{size.width()}x{size.height()}"
+        pixmap = QPixmapCache.find(key)
+        if pixmap is None or pixmap.isNull():
+            if not path.exists():
+                return None
+            pixmap = QPixmap(str(path)).scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            QPixmapCache.insert(key, pixmap)
+        return pixmap
+
     def open_text_input(self):
-        self.input_widget = TextInputWidget(self.interactive_box.content_widget)
-        self.interactive_box.set_title("AURA Command Console")
-        self.interactive_box.set_content_widget(self.input_widget)
-        self.interactive_box.show_box(260)
+        self.input_widget = self.interactive_box.show_panel(
+            "text", TextInputWidget, "AURA Command Console", 260)
 
     def open_face_recognition(self):
-        self.face_widget = FaceRecognitionWidget(self.interactive_box.content_widget)
-        self.interactive_box.set_title("Biometric Data Management")
-        self.interactive_box.set_content_widget(self.face_widget)
-        self.interactive_box.show_box(320)
+        self.face_widget = self.interactive_box.show_panel(
+            "face", FaceRecognitionWidget, "Biometric Data Management", 320)
 
     def load_custom_fonts(self):
         font_db = QFontDatabase()
@@ -1,17 +1,24 @@
 import sys
 import os
 import subprocess
+import sqlite3
 from pathlib import Path
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTextEdit,
     QScrollArea, QFrame, QSpacerItem, QSizePolicy, QGraphicsOpacityEffect,
-    QMessageBox, QInputDialog, QGridLayout
+    QMessageBox, QInputDialog, QGridLayout, QDialog, QStackedWidget, QTableWidget, QTableWidgetItem, QHeaderView,
+    QFileDialog
+)
+from PyQt5.QtGui import QPixmap, QPixmapCache, QFontDatabase
+from PyQt5.QtCore import (
+    Qt, QSize, QPropertyAnimation, QEasingCurve, QTimer, QCoreApplication,
+    QObject, pyqtSignal
 )
-from PyQt5.QtGui import QPixmap, QFontDatabase
-from PyQt5.QtCore import Qt, QSize, QPropertyAnimation, QEasingCurve, QTimer, QCoreApplication
 import os
-import threading
-from queries import listen, get_answer, speak
+from orchestrator import Orchestrator, qt_event_loop
+from tracing import tracer
+from face_catalog import FaceCatalog, CatalogError
+from face_gallery import FaceGalleryDialog
 
 os.environ["QT_QPA_PLATFORM"] = "xcb"
 
@@ -66,16 +73,38 @@ class ClosableWidget(QFrame):
         self.scroll_area.setWidget(self.content_widget)
         self.main_layout.addWidget(self.scroll_area)
 
+        # Panels are built once and kept; switching only changes the page
+        self.stack = QStackedWidget(self.content_widget)
+        self.stack.currentChanged.connect(self._fit_current_panel)
+        self.content_layout.addWidget(self.stack)
+        self.panels = {}
+
+        self.closing = False
+        self.hide_timer = QTimer(self)
+        self.hide_timer.setSingleShot(True)
+        self.hide_timer.timeout.connect(self.hide)
+
     def close_box(self):
+        self.closing = True
         self.animation.setStartValue(self.height())
         self.animation.setEndValue(0)
         self.animation.start()
         self.opacity_animation.setStartValue(1.0)
         self.opacity_animation.setEndValue(0.0)
         self.opacity_animation.start()
-        QTimer.singleShot(400, self.hide)
+        self.hide_timer.start(400)
 
     def show_box(self, desired_height=300):
+        if self.isVisible() and not self.closing:
+            # Already open: just grow or shrink to the new panel
+            if self.height() != desired_height:
+                self.animation.stop()
+                self.animation.setStartValue(self.height())
+                self.animation.setEndValue(desired_height)
+                self.animation.start()
+            return
+        self.closing = False
+        self.hide_timer.stop()
         self.show()
         self.animation.setStartValue(0)
         self.animation.setEndValue(desired_height)
@@ -84,12 +113,26 @@ class ClosableWidget(QFrame):
         self.opacity_animation.setEndValue(1.0)
         self.opacity_animation.start()
 
-    def set_content_widget(self, widget):
-        while self.content_layout.count():
-            item = self.content_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-        self.content_layout.addWidget(widget)
+    def panel(self, key, factory):
+        """The panel for `key`, built with factory() on first use."""
+        widget = self.panels.get(key)
+        if widget is None:
+            widget = self.panels[key] = factory()
+            self.stack.addWidget(widget)
+        return widget
+
+    def show_panel(self, key, factory, title, desired_height):
+        widget = self.panel(key, factory)
+        self.stack.setCurrentWidget(widget)
+        self.set_title(title)
+        self.show_box(desired_height)
+        return widget
+
+    def _fit_current_panel(self, index):
+        # A stack sizes to its largest page; let hidden pages shrink away
+        for i in range(self.stack.count()):
+            policy = QSizePolicy.Preferred if i == index else QSizePolicy.Ignored
+            self.stack.widget(i).setSizePolicy(policy, policy)
 
     def set_title(self, title):
         self.title_label.setText(title)
@@ -147,8 +190,11 @@ class TextInputWidget(QWidget):
 
 
 class FaceRecognitionWidget(QWidget):
-    def __init__(self, parent=None):
+    camera_released = pyqtSignal(str)       # name waiting to be registered
+
+    def __init__(self, parent=None, orchestrator=None):
         super().__init__(parent)
+        self.orchestrator = orchestrator
         self.main_layout = QVBoxLayout(self)
         self.main_layout.setSpacing(15)
         self.main_layout.setContentsMargins(0, 10, 0, 10)
@@ -179,6 +225,9 @@ class FaceRecognitionWidget(QWidget):
         self.recognize_btn.clicked.connect(self.recognize_face)
         self.manage_btn.clicked.connect(self.manage_dataset)
         self.open_data_btn.clicked.connect(self.open_data_folder)
+        self.camera_released.connect(self._launch_training)
+        if orchestrator is not None:
+            orchestrator.signals.vision.connect(self.on_vision)
 
     def show_message(self, title, message, icon=QMessageBox.Information):
         msg_box = QMessageBox()
@@ -238,40 +287,91 @@ class FaceRecognitionWidget(QWidget):
     def register_face(self):
         name, ok = QInputDialog.getText(self, "Register New Face", "Enter the name of the person:")
         if ok and name.strip():
-            script = self._get_app_dir() / "train.py"
-            self._run_python_script(script, [name.strip()])
+            name = name.strip()
+            if self.orchestrator is not None and self.orchestrator.vision_running:
+                # train.py needs the camera: launch it once live recognition has let go
+                stopped = self.orchestrator.stop_vision()
+                if stopped is not None:
+                    stopped.add_done_callback(lambda _: self.camera_released.emit(name))
+                    return
+            self._launch_training(name)
         else:
             self.show_message("Cancelled", "Registration cancelled.")
 
+    def _launch_training(self, name):
+        script = self._get_app_dir() / "train.py"
+        self._run_python_script(script, [name])
+
     def recognize_face(self):
+        if self.orchestrator is not None:
+            self.toggle_live_recognition()
+            return
         script = self._get_app_dir() / "recognise.py"
         self._run_python_script(script)
 
+    def toggle_live_recognition(self):
+        # In-process, alongside voice queries; greetings go through the same speech queue
+        if self.orchestrator.vision_running:
+            self.orchestrator.stop_vision()
+            self.recognize_btn.setText("Recognize Face (Live)")
+        else:
+            self.orchestrator.start_vision(0)
+            self.recognize_btn.setText("Stop Recognition")
+
+    def on_vision(self, running):
+        # Also resets the button when the camera won't open or nobody is enrolled
+        self.recognize_btn.setText("Stop Recognition" if running else "Recognize Face (Live)")
+
     def manage_dataset(self):
-        base = self._get_app_dir()
-        folder = base / "data"
-        folder.mkdir(exist_ok=True)
-        files = [f.name for f in folder.glob("*.npy")]
-        if not files:
-            self.show_message("No Data", "No registered faces found in the 'data' folder.")
+        folder = self._get_app_dir() / "data"
+        try:
+            catalog = FaceCatalog(folder)
+        except (sqlite3.Error, OSError) as e:
+            self.show_message("Catalog Error", f"Could not open the face catalog:\n{e}", QMessageBox.Critical)
             return
 
-        file, ok = QInputDialog.getItem(self, "Manage Dataset", "Choose face data file to manage:", files, 0, False)
-        if ok and file:
-            choice, ok2 = QInputDialog.getItem(self, "Action", f"Choose an action for {file}:", ["Rename", "Delete"], 0, False)
-            if ok2:
+        with catalog:
+            people = catalog.people()
+            if not people:
+                self.show_message("No Data", "No registered faces found in the 'data' folder.")
+                return
+
+            picker = FaceGalleryDialog(folder, people, self)
+            if picker.exec_() != QDialog.Accepted or picker.selected_name() is None:
+                return
+            name = picker.selected_name()
+
+            choice, ok2 = QInputDialog.getItem(self, "Action", f"Choose an action for {name}:",
+                                               ["Rename", "Merge into...", "Delete"], 0, False)
+            if not ok2:
+                return
+            try:
                 if choice == "Rename":
-                    new_name, ok3 = QInputDialog.getText(self, "Rename", "Enter new name (no extension):")
+                    new_name, ok3 = QInputDialog.getText(self, "Rename", "Enter the new name:")
                     if ok3 and new_name.strip():
-                        os.rename(folder / file, folder / f"{new_name.strip()}.npy")
-                        self.show_message("Renamed", f"{file} renamed to {new_name.strip()}.npy")
+                        catalog.rename(name, new_name)
+                        self.show_message("Renamed", f"{name} renamed to {new_name.strip()}")
+                elif choice == "Merge into...":
+                    # Editable, so samples can also be moved to a new name
+                    others = [p["name"] for p in people if p["name"] != name]
+                    target, ok3 = QInputDialog.getItem(self, "Merge", f"Add {name}'s samples to:", others, 0, True)
+                    target = target.strip()
+                    if ok3 and target and target != name:
+                        confirm = QMessageBox.question(self, "Confirm Merge",
+                                                       f"Merge {name} into {target}? {name} will be removed.",
+                                                       QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+                        if confirm == QMessageBox.Yes:
+                            catalog.merge([name], target)
+                            self.show_message("Merged", f"{name} merged into {target}.")
                 elif choice == "Delete":
                     confirm = QMessageBox.question(self, "Confirm Deletion",
-                                                   f"Are you sure you want to delete {file}?",
+                                                   f"Are you sure you want to delete {name}?",
                                                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
                     if confirm == QMessageBox.Yes:
-                        os.remove(folder / file)
-                        self.show_message("Deleted", f"{file} deleted.")
+                        catalog.delete(name)
+                        self.show_message("Deleted", f"{name} deleted.")
+            except (CatalogError, sqlite3.Error, OSError) as e:
+                self.show_message("Failed", str(e), QMessageBox.Critical)
 
     def open_data_folder(self):
         folder = self._get_app_dir() / "data"
@@ -288,9 +388,25 @@ class FaceRecognitionWidget(QWidget):
 
 
 
+class QuerySignals(QObject):
+    # Emitted from the orchestrator's loop and executors; Qt queues them onto the GUI thread
+    partial = pyqtSignal(str)
+    heard = pyqtSignal(str)
+    no_speech = pyqtSignal()
+    answered = pyqtSignal(str, str, float)   # query, answer, seconds since the click
+    failed = pyqtSignal(str, str)            # query, error
+    identified = pyqtSignal(str)             # name settled by face recognition
+    woke = pyqtSignal()                      # wake word heard in hands-free mode
+    vision = pyqtSignal(bool)                # camera opened / released by live recognition
+
+
 class DualQueryWidget(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, runner=None):
         super().__init__(parent)
+        if runner is None:
+            runner = Orchestrator(QuerySignals(self))
+            runner.start()
+        self.runner = runner
         self.main_layout = QVBoxLayout(self)
         self.main_layout.setSpacing(10)
         self.main_layout.setContentsMargins(0, 10, 0, 10)
@@ -310,14 +426,22 @@ class DualQueryWidget(QWidget):
         button_layout = QHBoxLayout()
         self.send_button = QPushButton("Send")
         self.speak_button = QPushButton("Speak")
-        for btn in [self.send_button, self.speak_button]:
+        self.hands_free_button = QPushButton("Hands-free: Off")
+        self.hands_free_button.setCheckable(True)
+        for btn in [self.send_button, self.speak_button, self.hands_free_button]:
             btn.setMinimumWidth(150)
             btn.setMinimumHeight(40)
             btn.setObjectName("SendQueryButton")
         button_layout.addWidget(self.send_button)
         button_layout.addWidget(self.speak_button)
+        button_layout.addWidget(self.hands_free_button)
         self.main_layout.addLayout(button_layout)
 
+        # Live transcript while listening
+        self.partial_label = QLabel("")
+        self.partial_label.setObjectName("PartialTranscript")
+        self.main_layout.addWidget(self.partial_label)
+
         # Output display
         self.output_box = QTextEdit()
         self.output_box.setReadOnly(True)
@@ -327,41 +451,130 @@ class DualQueryWidget(QWidget):
         # Connect actions
         self.send_button.clicked.connect(self.handle_text_query)
         self.speak_button.clicked.connect(self.handle_voice_query)
+        self.hands_free_button.toggled.connect(self.toggle_hands_free)
+
+        signals = self.runner.signals
+        signals.partial.connect(self.on_partial)
+        signals.heard.connect(self.on_heard)
+        signals.no_speech.connect(self.on_no_speech)
+        signals.answered.connect(self.on_answered)
+        signals.failed.connect(self.on_failed)
+        signals.identified.connect(self.on_identified)
+        signals.woke.connect(self.on_woke)
 
     def handle_text_query(self):
         query = self.text_input.toPlainText().strip()
         if not query:
             self.text_input.setPlaceholderText("Please enter a question.")
             return
-        self.output_box.append(f"🧑 You: {query}")
         self.text_input.clear()
-        threading.Thread(target=self.process_query, args=(query,), daemon=True).start()
+        if self.runner.submit_text(query):
+            self.output_box.append(f"🧑 You: {query}")
 
     def handle_voice_query(self):
+        if self.runner.submit_voice():
+            self.output_box.append("🎙 Listening... Speak now!")
+            self.speak_button.setEnabled(False)
+
+    def toggle_hands_free(self, enabled):
+        self.runner.set_hands_free(enabled)
+        self.hands_free_button.setText(f"Hands-free: {'On' if enabled else 'Off'}")
+        if enabled:
+            self.output_box.append("👂 Say \"Hey AURA\" to ask a question.")
+
+    def on_woke(self):
         self.output_box.append("🎙 Listening... Speak now!")
-        threading.Thread(target=self.process_voice_query, daemon=True).start()
+        self.speak_button.setEnabled(False)
 
-    def process_voice_query(self):
-        query = listen().strip()
-        if not query:
-            self.output_box.append("❌ No speech detected.")
-            speak("I didn’t catch that. Please try again.")
-            return
+    def on_partial(self, text):
+        self.partial_label.setText(f"… {text}")
+
+    def on_heard(self, query):
+        self.partial_label.clear()
+        self.speak_button.setEnabled(True)
         self.output_box.append(f"🗣 You said: {query}")
-        self.process_query(query)
 
-    def process_query(self, query):
-        try:
-            answer = get_answer(query)
-            self.output_box.append(f"🤖 AURA: {answer}\n")
-            speak(answer)
-        except Exception as e:
-            self.output_box.append(f"⚠️ Error: {e}")
+    def on_no_speech(self):
+        self.partial_label.clear()
+        self.speak_button.setEnabled(True)
+        self.output_box.append("❌ No speech detected.")
+
+    def on_answered(self, query, answer, seconds):
+        self.output_box.append(f"🤖 AURA: {answer}  ({seconds:.2f} s)\n")
+
+    def on_failed(self, query, error):
+        self.speak_button.setEnabled(True)
+        self.output_box.append(f"⚠️ Error: {error}")
+
+    def on_identified(self, name):
+        self.output_box.append(f"👋 Recognised {name}")
+
+
+class DiagnosticsWidget(QWidget):
+    COLUMNS = ["Stage", "Count", "p50 ms", "p95 ms", "Max ms"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.main_layout = QVBoxLayout(self)
+        self.main_layout.setSpacing(10)
+        self.main_layout.setContentsMargins(0, 10, 0, 10)
+
+        instruction_label = QLabel("Where the time goes on each query (latest 512 samples per stage):")
+        instruction_label.setObjectName("TextInputInstruction")
+        self.main_layout.addWidget(instruction_label)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.main_layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.dump_button = QPushButton("Save JSON Lines")
+        self.reset_button = QPushButton("Reset")
+        for btn in [self.dump_button, self.reset_button]:
+            btn.setMinimumHeight(40)
+            btn.setObjectName("SendQueryButton")
+            button_layout.addWidget(btn)
+        self.main_layout.addLayout(button_layout)
+
+        self.dump_button.clicked.connect(self.dump)
+        self.reset_button.clicked.connect(self.reset)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        summary = tracer.summary()
+        self.table.setRowCount(len(summary))
+        for row, (name, stats) in enumerate(summary.items()):
+            values = [name, str(stats["count"]), f"{stats['p50_ms']:.1f}",
+                      f"{stats['p95_ms']:.1f}", f"{stats['max_ms']:.1f}"]
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(value))
+
+    def dump(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save Trace", "aura_trace.jsonl", "JSON Lines (*.jsonl)")
+        if path:
+            count = tracer.dump_jsonl(path)
+            QMessageBox.information(self, "Trace Saved", f"Wrote {count} spans to {path}")
+
+    def reset(self):
+        tracer.reset()
+        self.table.setRowCount(0)
 
 
 class BotGUI(QWidget):
-    def __init__(self):
+    def __init__(self, loop=None):
         super().__init__()
+        # One runtime for vision, listening, answering and speaking
+        self.orchestrator = Orchestrator(QuerySignals(self))
+        self.orchestrator.start(loop)
         self.BASE_DIR = Path(QCoreApplication.applicationDirPath()) if getattr(sys, 'frozen', False) else Path(__file__).resolve().parent
         self.assets_dir = self.BASE_DIR / "assets"
         self.font_dir = self.BASE_DIR / "fonts"
@@ -389,10 +602,8 @@ class BotGUI(QWidget):
         # Header
         header_layout = QVBoxLayout()
         header_layout.setAlignment(Qt.AlignCenter)
-        bot_icon_path = self.assets_dir / "aura_icon.jpg"
-        if bot_icon_path.exists():
-            pixmap = QPixmap(str(bot_icon_path))
-            scaled_pixmap = pixmap.scaled(QSize(400, 350), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        scaled_pixmap = self.header_pixmap()
+        if scaled_pixmap is not None:
             bot_label = QLabel()
             bot_label.setPixmap(scaled_pixmap)
             bot_label.setAlignment(Qt.AlignCenter)
@@ -420,32 +631,45 @@ class BotGUI(QWidget):
         self.train_btn = QPushButton("Record / Train Face")
         self.recognize_btn = QPushButton("Recognize Face")
         self.manage_btn = QPushButton("Manage Face Data")
-        for b in [self.train_btn, self.recognize_btn, self.manage_btn]:
+        self.diagnostics_btn = QPushButton("Diagnostics")
+        for b in [self.train_btn, self.recognize_btn, self.manage_btn, self.diagnostics_btn]:
             sec_layout.addWidget(b)
         main_layout.addLayout(sec_layout)
         self.train_btn.clicked.connect(self.open_face_recognition)
         self.recognize_btn.clicked.connect(self.open_face_recognition)
         self.manage_btn.clicked.connect(self.open_face_recognition)
+        self.diagnostics_btn.clicked.connect(self.open_diagnostics)
         self.setStyleSheet(self.get_stylesheet())
         self.show()
 
+    def header_pixmap(self, size=QSize(400, 350)):
+        # Scaled once and kept in Qt's pixmap cache
+        path = self.assets_dir / "aura_icon.jpg"
+        key = f"aura-header-{size.width()}x{size.height()}"
+        pixmap = QPixmapCache.find(key)
+        if pixmap is None or pixmap.isNull():
+            if not path.exists():
+                return None
+            pixmap = QPixmap(str(path)).scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            QPixmapCache.insert(key, pixmap)
+        return pixmap
+
     def open_text_input(self):
-        self.input_widget = TextInputWidget(self.interactive_box.content_widget)
-        self.interactive_box.set_title("AURA Command Console")
-        self.interactive_box.set_content_widget(self.input_widget)
-        self.interactive_box.show_box(260)
+        self.input_widget = self.interactive_box.show_panel(
+            "text", TextInputWidget, "AURA Command Console", 260)
 
     def open_dual_query(self):
-        self.dual_query_widget = DualQueryWidget(self.interactive_box.content_widget)
-        self.interactive_box.set_title("AURA Voice & Text Query Interface")
-        self.interactive_box.set_content_widget(self.dual_query_widget)
-        self.interactive_box.show_box(380)
+        # Kept across clicks, so the conversation history stays
+        self.dual_query_widget = self.interactive_box.show_panel(
+            "query", lambda: DualQueryWidget(runner=self.orchestrator), "AURA Voice & Text Query Interface", 380)
 
     def open_face_recognition(self):
-        self.face_widget = FaceRecognitionWidget(self.interactive_box.content_widget)
-        self.interactive_box.set_title("Biometric Data Management")
-        self.interactive_box.set_content_widget(self.face_widget)
-        self.interactive_box.show_box(320)
+        self.face_widget = self.interactive_box.show_panel(
+            "face", lambda: FaceRecognitionWidget(orchestrator=self.orchestrator), "Biometric Data Management", 320)
+
+    def open_diagnostics(self):
+        self.diagnostics_widget = self.interactive_box.show_panel(
+            "diagnostics", DiagnosticsWidget, "AURA Latency Diagnostics", 420)
 
     def load_custom_fonts(self):
         font_db = QFontDatabase()
@@ -495,5 +719,10 @@ class BotGUI(QWidget):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    gui = BotGUI()
-    sys.exit(app.exec_())
+    loop = qt_event_loop(app)      # None without qasync: the orchestrator gets its own thread
+    gui = BotGUI(loop)
+    app.aboutToQuit.connect(gui.orchestrator.stop)
+    if loop is None:
+        sys.exit(app.exec_())
+    with loop:
+        loop.run_forever()
@@ -0,0 +1,424 @@
+"""One asyncio runtime for AURA's camera, speech recognition and speech output.
+
+Every stage is a task on one event loop, joined by bounded queues:
+
+    capture -> frames -> detect -> detections -> recognize --+
+    voice requests -> listen --+                             |
+    text queries --------------+-> queries -> answer -> speech -> speak
+
+Blocking work (OpenCV, Vosk, the FAQ encoder, pyttsx3) runs on small
+executors so the loop itself only schedules. The queues push back: the
+newest camera frame replaces one detection has not taken yet, detection
+waits for recognition, and greetings are dropped rather than queued behind
+a full speech queue. Output is half-duplex: one utterance at a time,
+listening waits until AURA has stopped talking, she doesn't start while the
+microphone is open, and a new voice query cuts her off. Vision slows down
+while someone is speaking so Vosk gets the CPU. The camera is only opened,
+read and released on its own thread. stop() cancels every task together.
+
+With qasync installed the loop is the Qt event loop (qt_event_loop());
+otherwise it runs on a background thread and reports back through the
+Qt signals it was given, which are safe to emit from any thread.
+"""
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from face_pipeline import dataset_path, load_detector, detect_faces, load_recognizer, FAR_TARGET
+from frame_source import FrameSource
+from preprocess import load_preprocessor
+from queries import listen, get_answer, speak, clean, wait_for_wake_word, strip_wake_word
+from speech import PRIORITY_ANSWER, PRIORITY_GREETING
+from tracing import tracer
+from tracking import FaceTracker
+
+FRAME_QUEUE = 1             # frames waiting for detection; newer ones replace them
+DETECTION_QUEUE = 2         # detected frames waiting for recognition
+QUERY_QUEUE = 4             # questions waiting for an answer; more are refused
+SPEECH_QUEUE = 4            # utterances waiting to be spoken
+LISTENING_VISION_FPS = 2.0  # detection rate while the microphone is in use
+VOICE_KEY = "<voice>"
+NO_SPEECH_REPLY = "I didn’t catch that. Please try again."
+GREETING = "Hi {name}. Welcome to Utpal Shanghvi Global School!"
+
+
+def qt_event_loop(app):
+    """An asyncio loop running on the Qt event loop, or None without qasync."""
+    try:
+        import qasync
+    except ImportError:
+        return None
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+def identify_faces(recognizer, preprocess, frame, boxes):
+    # prepare() reuses its buffer; keep a copy of each face for the batch
+    faces = [recognizer.prepare(frame[y1:y2, x1:x2], preprocess).copy() for x1, y1, x2, y2, _ in boxes]
+    return recognizer.identify_batch(faces)
+
+
+class Orchestrator:
+    """Owns the tasks; its public methods may be called from any thread.
+
+    `signals` is an object with Qt-style signals (partial, heard, no_speech,
+    answered, failed, identified, woke, vision), or None to run without a GUI.
+    """
+
+    def __init__(self, signals=None, backend="lbph", far=FAR_TARGET, greet=True):
+        self.signals = signals
+        self.backend = backend
+        self.far = far
+        self.greet = greet
+        self.loop = None
+        self.dropped_frames = 0
+        self._thread = None
+        self._tasks = set()
+        self._vision_tasks = []
+        self._wake_task = None
+        self._source = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._current = None            # utterance being spoken
+        self._interrupts = 0
+        self._mic_users = 0
+        self._greeted = set()
+        # One thread each: vision and ASR never take more than a core apiece
+        self._capture_pool = ThreadPoolExecutor(1, thread_name_prefix="capture")
+        self._vision_pool = ThreadPoolExecutor(1, thread_name_prefix="vision")
+        self._audio_pool = ThreadPoolExecutor(1, thread_name_prefix="asr")
+        self._answer_pool = ThreadPoolExecutor(1, thread_name_prefix="answer")
+
+    # ---------- lifecycle ----------
+    def start(self, loop=None):
+        """Run on `loop` (e.g. from qt_event_loop()) or on a new background thread."""
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, name="orchestrator", daemon=True)
+            self._thread.start()
+        self.loop = loop
+        loop.call_soon_threadsafe(self._start)
+
+    def _start(self):
+        # Queues and events belong to the loop, so they are made on it
+        self._voice = asyncio.Queue(maxsize=1)
+        self._queries = asyncio.Queue(maxsize=QUERY_QUEUE)
+        self._speech = asyncio.PriorityQueue(maxsize=SPEECH_QUEUE)
+        self._quiet = asyncio.Event()
+        self._quiet.set()
+        self._mic_idle = asyncio.Event()     # set while nothing has the microphone open
+        self._mic_idle.set()
+        self._listening = asyncio.Event()
+        for coro in (self._listen_task(), self._answer_task(), self._speak_task()):
+            self._spawn(coro)
+
+    def stop(self):
+        if self.loop is None:
+            return
+        if self._thread is None:
+            self._shutdown()            # already on the loop's thread
+        else:
+            self.loop.call_soon_threadsafe(self._shutdown)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=2)
+        self.loop = None
+
+    def _shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._current is not None:
+            self._current.cancel()
+        # Released on the capture thread, after any read still in progress
+        self._capture_pool.submit(self._release_source)
+        self._capture_pool.shutdown(wait=False)
+        for pool in (self._vision_pool, self._audio_pool, self._answer_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _spawn(self, coro):
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Orchestrator task failed: {task.exception()!r}")
+            self._emit("failed", "", str(task.exception()))
+            if task in self._vision_tasks:
+                # The pipeline can't run without it; release the camera
+                self._spawn(self._stop_vision())
+
+    def _emit(self, name, *args):
+        signal = getattr(self.signals, name, None)
+        if signal is not None:
+            signal.emit(*args)
+
+    def _run(self, pool, fn, *args):
+        # Blocking call on an executor, in the current trace
+        return self.loop.run_in_executor(pool, contextvars.copy_context().run, fn, *args)
+
+    # ---------- requests (any thread) ----------
+    def submit_text(self, query):
+        return self._submit(clean(query) or query, query)
+
+    def submit_voice(self):
+        return self._submit(VOICE_KEY, None)
+
+    def _submit(self, key, query):
+        # The same question twice in a row is answered once
+        with self._lock:
+            if self.loop is None or key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+        self.loop.call_soon_threadsafe(self._enqueue, key, query)
+        return True
+
+    def _enqueue(self, key, query):
+        if key == VOICE_KEY:
+            self._interrupt()
+            queue, item = self._voice, time.perf_counter()
+        else:
+            queue, item = self._queries, (key, query, time.perf_counter(), None)
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self._finish(key)
+            self._emit("failed", query or "", "AURA is busy, please ask again in a moment.")
+
+    def _finish(self, key):
+        with self._lock:
+            self._in_flight.discard(key)
+
+    def _interrupt(self):
+        # A new voice query: stop talking and forget what was still to be said
+        self._interrupts += 1
+        while not self._speech.empty():
+            self._speech.get_nowait()
+        if self._current is not None:
+            self._current.cancel()
+
+    def set_hands_free(self, enabled):
+        """Listen for "hey aura" continuously instead of waiting for submit_voice()."""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._set_hands_free, enabled)
+
+    def _set_hands_free(self, enabled):
+        if enabled and self._wake_task is None:
+            self._wake_task = self._spawn(self._wake_listen_task())
+        elif not enabled and self._wake_task is not None:
+            self._wake_task.cancel()
+            self._wake_task = None
+
+    def start_vision(self, source=0):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._start_vision, source)
+
+    def stop_vision(self):
+        """Stop the camera; the returned future is done once it has been released."""
+        if self.loop is None:
+            return None
+        return asyncio.run_coroutine_threadsafe(self._stop_vision(), self.loop)
+
+    @property
+    def vision_running(self):
+        return bool(self._vision_tasks)
+
+    # ---------- speech ----------
+    def _queue_speech(self, text, priority, trace_id=None):
+        try:
+            self._speech.put_nowait((priority, next(self._seq), text, trace_id))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def _take_mic(self):
+        self._mic_users += 1
+        self._mic_idle.clear()
+
+    def _free_mic(self):
+        self._mic_users -= 1
+        if not self._mic_users:
+            self._mic_idle.set()
+
+    async def _speak_task(self):
+        while True:
+            priority, _, text, trace_id = await self._speech.get()
+            interrupts = self._interrupts
+            # Never talk into an open microphone; re-checked because the
+            # listener may take it again before this task resumes
+            while not self._mic_idle.is_set():
+                await self._mic_idle.wait()
+            if interrupts != self._interrupts:
+                continue                        # a voice query came in meanwhile
+            self._quiet.clear()
+            try:
+                with tracer.use_trace(trace_id):
+                    self._current = speak(text, priority=priority)
+                await self._run(None, self._current.wait)
+            finally:
+                self._current = None
+                if self._speech.empty():
+                    self._quiet.set()
+
+    async def _listen_task(self):
+        while True:
+            await self._voice.get()
+            while not self._quiet.is_set():     # never listen to ourselves
+                await self._quiet.wait()
+            self._take_mic()
+            self._listening.set()
+            try:
+                with tracer.trace("voice_query") as trace_id:
+                    query = (await self._run(self._audio_pool, listen, True, self._on_partial)).strip()
+                    query = strip_wake_word(query)
+            except Exception as e:
+                self._finish(VOICE_KEY)
+                self._emit("failed", "", str(e))
+                continue
+            finally:
+                self._listening.clear()
+                self._free_mic()
+            if not query:
+                self._finish(VOICE_KEY)
+                self._emit("no_speech")
+                self._queue_speech(NO_SPEECH_REPLY, PRIORITY_ANSWER, trace_id)
+                continue
+            self._emit("heard", query)
+            # The mic is free again, so a new voice query may start now
+            self._finish(VOICE_KEY)
+            # Waits while the answer queue is full; time the answer, not the speaker
+            await self._queries.put((VOICE_KEY, query, time.perf_counter(), trace_id))
+
+    async def _wake_listen_task(self):
+        while True:
+            while not self._quiet.is_set():     # AURA saying her own name doesn't count
+                await self._quiet.wait()
+            with self._lock:
+                busy = VOICE_KEY in self._in_flight
+            if busy:
+                await asyncio.sleep(0.2)
+                continue
+            # Holds the mic for the whole poll, so AURA can't start talking
+            # into it; shares the ASR thread with listen(), so the two never overlap
+            self._take_mic()
+            try:
+                woke = await self._run(self._audio_pool, wait_for_wake_word)
+            finally:
+                self._free_mic()
+            if woke and self._submit(VOICE_KEY, None):
+                self._emit("woke")
+            # Let an utterance waiting for the mic take it before the next poll
+            await asyncio.sleep(0)
+
+    def _on_partial(self, text):
+        self._emit("partial", text)
+
+    async def _answer_task(self):
+        while True:
+            key, query, started, trace_id = await self._queries.get()
+            try:
+                if trace_id is None:
+                    with tracer.trace("text_query") as trace_id:
+                        answer = await self._run(self._answer_pool, get_answer, query)
+                else:
+                    with tracer.use_trace(trace_id):
+                        answer = await self._run(self._answer_pool, get_answer, query)
+            except Exception as e:
+                self._emit("failed", query, str(e))
+                continue
+            finally:
+                if key != VOICE_KEY:        # released by _listen_task already
+                    self._finish(key)
+            self._emit("answered", query, answer, time.perf_counter() - started)
+            await self._speech.put((PRIORITY_ANSWER, next(self._seq), answer, trace_id))
+
+    # ---------- vision ----------
+    def _start_vision(self, source):
+        if self._vision_tasks:
+            return
+        self._frames = asyncio.Queue(maxsize=FRAME_QUEUE)
+        self._detections = asyncio.Queue(maxsize=DETECTION_QUEUE)
+        self._tracker = FaceTracker()
+        self._vision_tasks = [self._spawn(self._capture_task(source)),
+                              self._spawn(self._detect_task()),
+                              self._spawn(self._recognize_task())]
+
+    async def _stop_vision(self):
+        tasks, self._vision_tasks = self._vision_tasks, []
+        for task in tasks:
+            task.cancel()
+        # Queued now, so it runs after any open or read already on the capture thread
+        released = self._run(self._capture_pool, self._release_source)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await released
+        self._emit("vision", False)
+
+    def _open_source(self, source):
+        # Capture thread only, like every read and the release: an open that
+        # outlives a cancelled task is still released after it
+        self._source = FrameSource(source)
+        return self._source
+
+    def _release_source(self):
+        if self._source is not None:
+            self._source.release()
+            self._source = None
+
+    async def _capture_task(self, source):
+        source = await self._run(self._capture_pool, self._open_source, source)
+        if not source.isOpened():
+            self._emit("failed", "", f"Cannot open {source.name}")
+            self._spawn(self._stop_vision())
+            return
+        self._emit("vision", True)
+        while True:
+            ret, frame = await self._run(self._capture_pool, source.read)
+            if not ret:
+                if source.finished:
+                    break
+                continue
+            if self._frames.full():
+                self._frames.get_nowait()       # stale: detection is behind
+                self.dropped_frames += 1
+            self._frames.put_nowait(frame)
+        self._spawn(self._stop_vision())
+
+    async def _detect_task(self):
+        net = await self._run(self._vision_pool, load_detector)
+        while True:
+            frame = await self._frames.get()
+            if self._listening.is_set():
+                await asyncio.sleep(1.0 / LISTENING_VISION_FPS)
+            boxes = await self._run(self._vision_pool, detect_faces, net, frame)
+            tracks, _ = self._tracker.update(boxes)
+            await self._detections.put((frame, boxes, tracks))
+
+    async def _recognize_task(self):
+        recognizer = await self._run(self._vision_pool, load_recognizer, dataset_path,
+                                     self.backend, self.far, False)
+        if recognizer is None:
+            self._emit("failed", "", "No faces enrolled yet; register someone first.")
+            self._spawn(self._stop_vision())
+            return
+        preprocess = load_preprocessor(dataset_path)
+        while True:
+            frame, boxes, tracks = await self._detections.get()
+            todo = [(box, track) for box, track in zip(boxes, tracks) if not track.committed]
+            if not todo:
+                continue
+            results = await self._run(self._vision_pool, identify_faces, recognizer, preprocess,
+                                      frame, [box for box, _ in todo])
+            for ((*_, confidence), track), (name, dist) in zip(todo, results):
+                track.score = dist
+                if self._tracker.vote(track, name, confidence * recognizer.confidence(name, dist)):
+                    self._emit("identified", track.name)
+                    if self.greet and track.name not in self._greeted:
+                        # Dropped, not queued, when AURA already has plenty to say
+                        if self._queue_speech(GREETING.format(name=track.name), PRIORITY_GREETING):
+                            self._greeted.add(track.name)
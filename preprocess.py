@@ -0,0 +1,137 @@
+"""Face normalization shared by enrollment and recognition.
+
+train.py stores faces exactly as recognise.py sees them: grayscale,
+optionally eye-aligned, histogram-equalized (or CLAHE) and resized to
+FACE_SIZE. The settings a gallery was enrolled with are kept next to it in
+data/preprocess.json so both sides always agree.
+"""
+from pathlib import Path
+import json
+
+import cv2
+import numpy as np
+
+FACE_SIZE = (128, 128)
+CONFIG_FILE = "preprocess.json"
+MAX_ALIGN_ANGLE = 20.0      # degrees; steeper eye lines are usually a false eye detection
+
+DEFAULT_CONFIG = {
+    "size": list(FACE_SIZE),
+    "clahe": False,
+    "clip_limit": 2.0,
+    "tile_grid": 8,
+    "align": False,
+}
+
+
+class Preprocessor:
+    """Callable face normalizer that reuses its working buffers.
+
+    The returned image is an internal buffer overwritten by the next call;
+    pass `out=` (e.g. a row of a preallocated array) or copy it to keep it.
+    Not thread-safe: use one instance per thread or worker.
+    """
+
+    def __init__(self, size=FACE_SIZE, clahe=False, clip_limit=2.0, tile_grid=8, align=False):
+        self.size = tuple(size)
+        self.config = {"size": list(self.size), "clahe": clahe, "clip_limit": clip_limit,
+                       "tile_grid": tile_grid, "align": align}
+        self._clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid)) if clahe else None
+        self._eyes = None
+        if align:
+            # Ships with the opencv-python wheels
+            cascade = getattr(getattr(cv2, "data", None), "haarcascades", "") + "haarcascade_eye.xml"
+            self._eyes = cv2.CascadeClassifier(cascade)
+            if self._eyes.empty():
+                print(f"Eye cascade not found at {cascade}; faces will not be aligned.")
+                self._eyes = None
+        self._buffers = {}
+        self._out = np.empty((self.size[1], self.size[0]), dtype=np.uint8)
+
+    @classmethod
+    def from_config(cls, config):
+        config = {**DEFAULT_CONFIG, **config}
+        return cls(config["size"], config["clahe"], config["clip_limit"], config["tile_grid"], config["align"])
+
+    def _buffer(self, key, shape):
+        # Grow-only scratch memory; crops change size every frame, so hand
+        # out a view of the right shape instead of reallocating
+        need = shape[0] * shape[1]
+        buf = self._buffers.get(key)
+        if buf is None or buf.size < need:
+            buf = self._buffers[key] = np.empty(need, dtype=np.uint8)
+        return buf[:need].reshape(shape)
+
+    def _align(self, gray):
+        h, w = gray.shape
+        min_eye = max(8, w // 10)
+        eyes = self._eyes.detectMultiScale(gray[:h // 2], scaleFactor=1.1, minNeighbors=5,
+                                           minSize=(min_eye, min_eye))
+        if len(eyes) < 2:
+            return gray
+        eyes = sorted(sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2], key=lambda e: e[0])
+        (lx, ly, lw, lh), (rx, ry, rw, rh) = eyes
+        left = (lx + lw / 2, ly + lh / 2)
+        right = (rx + rw / 2, ry + rh / 2)
+        angle = float(np.degrees(np.arctan2(right[1] - left[1], right[0] - left[0])))
+        if abs(angle) > MAX_ALIGN_ANGLE:
+            return gray
+        center = ((left[0] + right[0]) / 2, (left[1] + right[1]) / 2)
+        rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+        return cv2.warpAffine(gray, rotation, (w, h), dst=self._buffer("aligned", (h, w)),
+                              borderMode=cv2.BORDER_REPLICATE)
+
+    def __call__(self, face_section, out=None):
+        h, w = face_section.shape[:2]
+        if face_section.ndim == 2:
+            gray = face_section
+        else:
+            gray = cv2.cvtColor(face_section, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray", (h, w)))
+        if self._eyes is not None:
+            gray = self._align(gray)
+
+        equalized = self._buffer("equalized", (h, w))
+        if self._clahe is not None:
+            self._clahe.apply(gray, equalized)
+        else:
+            cv2.equalizeHist(gray, dst=equalized)
+
+        out = self._out if out is None else out
+        cv2.resize(equalized, self.size, dst=out)
+        return out
+
+
+def load_config(path):
+    file = Path(path) / CONFIG_FILE
+    if file.exists():
+        try:
+            return {**DEFAULT_CONFIG, **json.loads(file.read_text(encoding="utf-8"))}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable {file}: {e}")
+    return dict(DEFAULT_CONFIG)
+
+
+def save_config(path, config):
+    (Path(path) / CONFIG_FILE).write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+
+def gallery_preprocessor(path, clahe=False, align=False):
+    """Preprocessor for enrolling into `path`.
+
+    Every person in a gallery must be normalized the same way, so the
+    settings are fixed by the first enrollment and reused after that.
+    """
+    config = load_config(path)
+    if any(Path(path).glob("*.npy")):
+        if (clahe and not config["clahe"]) or (align and not config["align"]):
+            print(" Ignoring --clahe/--align: the existing gallery was enrolled without them.")
+    else:
+        config.update(clahe=clahe, align=align)
+        save_config(path, config)
+    return Preprocessor.from_config(config)
+
+
+def load_preprocessor(path):
+    """Preprocessor matching the gallery enrolled in `path`."""
+    return Preprocessor.from_config(load_config(path))
+
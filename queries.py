@@ -83,10 +83,21 @@
 #         speak(answer)
 # queries_module.py
 
-from sentence_transformers import SentenceTransformer, util
 from rapidfuzz import process, fuzz
 from vosk import Model, KaldiRecognizer
-import torch, json, re, sounddevice as sd, pyttsx3
+import os, json, re, threading, sounddevice as sd
+from audio_frontend import AudioFrontEnd, WAKE_PHRASES, vocabulary_grammar
+from speech import get_speech_service, PRIORITY_ANSWER
+from encoders import load_encoder
+from tracing import span
+import numpy as np
+
+# "torch" (default), "torch-int8", "onnx" or "onnx-int8"; the ONNX backends
+# need the files written by export_encoder.py and never import torch.
+ENCODER_BACKEND = os.environ.get("AURA_ENCODER", "torch")
+# "faq" decodes against the FAQ's vocabulary first and falls back to the full
+# model when unsure; "full" always uses the full vocabulary.
+ASR_MODE = os.environ.get("AURA_ASR", "faq")
 
 faq = {
     "who is the principal": "Dr. Anita Sharma is the principal of our school.",
@@ -105,46 +116,153 @@ def clean(text):
     return text.strip()
 
 # Load models once
-print("Loading language model...")
-model = SentenceTransformer('all-MiniLM-L6-v2')
+print(f"Loading language model ({ENCODER_BACKEND})...")
+encoder = load_encoder(ENCODER_BACKEND)
 faq_questions = list(faq.keys())
 faq_answers = list(faq.values())
-faq_embeddings = model.encode(faq_questions, convert_to_tensor=True)
+faq_embeddings = encoder.encode(faq_questions)
+
+vosk_model = None
+_frontend = None
+_frontend_lock = threading.Lock()
+
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 1600           # 100 ms of audio per callback
+ENERGY_THRESHOLD = 500      # int16 RMS above which a block counts as speech
+PRE_ROLL = 0.3              # seconds of audio kept from before listen() was called
+
+def faq_grammar():
+    # Question words plus the names in the answers; built from `faq` on every
+    # call, so an edited FAQ gets a new recognizer on the next question.
+    # The wake words are in too: in hands-free mode the pre-roll can catch the
+    # tail of "hey aura", which strip_wake_word() removes after decoding.
+    names = {w.lower() for answer in faq.values() for w in re.findall(r"\b[A-Z][a-z]+\b", answer)}
+    wake_words = {w for phrase in WAKE_PHRASES for w in phrase.split()}
+    return vocabulary_grammar([clean(q) for q in faq], names | wake_words)
 
-print("Loading Vosk model...")
-vosk_model = Model("vosk_model_in")
+def get_vosk_model():
+    global vosk_model
+    if vosk_model is None:
+        print("Loading Vosk model...")
+        vosk_model = Model("vosk_model_in")
+    return vosk_model
 
-def listen():
-    fs = 16000
-    duration = 5
+def get_audio_frontend():
+    # The input stream stays open between questions so there is no device-open
+    # delay and the pre-roll already holds audio when the user starts talking.
+    global _frontend
+    with _frontend_lock:
+        if _frontend is None:
+            _frontend = AudioFrontEnd(get_vosk_model(), sample_rate=SAMPLE_RATE,
+                                      block_size=BLOCK_SIZE, pre_roll=PRE_ROLL)
+        _frontend.start()
+    return _frontend
+
+def _listen_fixed(duration=5):
     print("Listening... Speak now!")
-    recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
+    recording = sd.rec(int(duration * SAMPLE_RATE), samplerate=SAMPLE_RATE, channels=1, dtype='int16')
     sd.wait()
-    rec = KaldiRecognizer(vosk_model, fs)
+    rec = KaldiRecognizer(get_vosk_model(), SAMPLE_RATE)
     rec.AcceptWaveform(recording.tobytes())
     result = json.loads(rec.Result())
     return result.get("text", "")
 
-def speak(text):
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 145)
-    engine.setProperty('volume', 1.0)
-    engine.say(text)
-    engine.runAndWait()
-    engine.stop()
+def listen(streaming=True, on_partial=None, start_timeout=5.0, silence_timeout=0.8,
+           max_duration=10.0, energy_threshold=ENERGY_THRESHOLD):
+    # Streaming mode feeds 100 ms blocks to the recognizer as they arrive and
+    # ends the utterance once the speaker has been quiet for `silence_timeout`.
+    if not streaming:
+        return _listen_fixed()
+    frontend = get_audio_frontend()
+    print("Listening... Speak now!")
+    grammar = faq_grammar() if ASR_MODE == "faq" else None
+    with span("listen"):
+        return frontend.listen(on_partial=on_partial, start_timeout=start_timeout,
+                               silence_timeout=silence_timeout, max_duration=max_duration,
+                               energy_threshold=energy_threshold, grammar=grammar)
+
+def wait_for_wake_word(timeout=1.0, energy_threshold=ENERGY_THRESHOLD):
+    # Hands-free mode: cheap grammar decoding of "aura"/"hey aura" only;
+    # returns False after `timeout` so callers can stop or pause in between
+    return get_audio_frontend().wait_for_wake_word(WAKE_PHRASES, timeout=timeout,
+                                                   energy_threshold=energy_threshold)
+
+def strip_wake_word(text):
+    # "hey aura who is the principal" -> "who is the principal"
+    for phrase in WAKE_PHRASES:
+        if text == phrase or text.startswith(phrase + " "):
+            return text[len(phrase):].strip()
+    return text
+
+TTS_CACHE_DIR = None        # e.g. "tts_cache" to replay frequent answers from WAV files
+
+def speak(text, priority=PRIORITY_ANSWER, wait=False):
+    # All speech goes through the one engine thread in speech.py
+    service = get_speech_service(cache_dir=TTS_CACHE_DIR)
+    utterance = service.say(text, priority=priority)
+    if wait:
+        utterance.wait()
+    return utterance
+
+NO_SPEECH_ANSWER = "I didn’t catch that. Please repeat your question."
+UNKNOWN_ANSWER = "Sorry, I don't know that yet."
+UNKNOWN = -1    # index returned by choose_indices when nothing matches
+EMPTY = -2      # index returned for queries that clean() down to nothing
+
+def score_queries(queries, batch_size=64):
+    # Fuzzy and semantic scores for a whole batch: one encode call, one
+    # similarity matrix and one rapidfuzz cdist instead of a loop per query.
+    with span("answer.clean"):
+        cleaned = [clean(q) for q in queries]
+    n = len(queries)
+    scores = {
+        "empty": np.array([not c for c in cleaned], dtype=bool),
+        "fuzzy_idx": np.zeros(n, dtype=np.int64),
+        "fuzzy_score": np.zeros(n, dtype=np.float32),
+        "semantic_idx": np.zeros(n, dtype=np.int64),
+        "semantic_score": np.zeros(n, dtype=np.float32),
+    }
+    keep = np.flatnonzero(~scores["empty"])
+    if len(keep) == 0:
+        return scores
+
+    with span("answer.fuzzy"):
+        fuzzy = process.cdist([cleaned[i] for i in keep], faq_questions, scorer=fuzz.token_sort_ratio,
+                              workers=-1 if len(keep) > 64 else 1)
+    scores["fuzzy_idx"][keep] = fuzzy.argmax(axis=1)
+    scores["fuzzy_score"][keep] = fuzzy.max(axis=1)
+
+    # Embeddings are unit length, so the matrix product is the cosine similarity
+    with span("answer.encode"):
+        query_embs = encoder.encode([queries[i] for i in keep], batch_size=batch_size)
+    with span("answer.cosine"):
+        sims = query_embs @ faq_embeddings.T
+    scores["semantic_idx"][keep] = sims.argmax(axis=1)
+    scores["semantic_score"][keep] = sims.max(axis=1)
+    return scores
+
+def choose_indices(scores, semantic_threshold=0.55, fuzzy_threshold=30):
+    semantic_ok = scores["semantic_score"] >= semantic_threshold
+    use_fuzzy = (scores["fuzzy_score"] >= fuzzy_threshold) & ~semantic_ok
+    chosen = np.full(len(semantic_ok), UNKNOWN, dtype=np.int64)
+    chosen[semantic_ok] = scores["semantic_idx"][semantic_ok]
+    chosen[use_fuzzy] = scores["fuzzy_idx"][use_fuzzy]
+    chosen[scores["empty"]] = EMPTY
+    return chosen
+
+def get_answers(queries, semantic_threshold=0.55, fuzzy_threshold=30, batch_size=64):
+    queries = list(queries)
+    with span("get_answer", batch=len(queries)):
+        scores = score_queries(queries, batch_size=batch_size)
+    answers = []
+    for idx in choose_indices(scores, semantic_threshold, fuzzy_threshold):
+        if idx == EMPTY:
+            answers.append(NO_SPEECH_ANSWER)
+        elif idx == UNKNOWN:
+            answers.append(UNKNOWN_ANSWER)
+        else:
+            answers.append(faq_answers[idx])
+    return answers
 
 def get_answer(query, semantic_threshold=0.55, fuzzy_threshold=30):
-    query_clean = clean(query)
-    if not query_clean:
-        return "I didn’t catch that. Please repeat your question."
-    fuzzy_match, fuzzy_score, _ = process.extractOne(query_clean, faq_questions, scorer=fuzz.token_sort_ratio)
-    query_emb = model.encode(query, convert_to_tensor=True)
-    scores = util.cos_sim(query_emb, faq_embeddings)[0]
-    best_idx = int(torch.argmax(scores))
-    semantic_score = float(scores[best_idx])
-    if fuzzy_score >= fuzzy_threshold and semantic_score < semantic_threshold:
-        return faq[fuzzy_match]
-    elif semantic_score >= semantic_threshold:
-        return faq_answers[best_idx]
-    else:
-        return "Sorry, I don't know that yet."
+    return get_answers([query], semantic_threshold, fuzzy_threshold)[0]
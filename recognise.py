@@ -1,182 +1,352 @@
 
 
-from pathlib import Path
-import numpy as np
+from face_pipeline import (BASE_DIR, dataset_path, load_detector, detect_faces,
+                           load_backend_gallery, FaceRecognizer, FAR_TARGET, BACKENDS,
+                           load_calibration, calibration_report, load_recognizer)
+from face_catalog import FaceCatalog
+from face_embedding import FaceEmbedder
+from compact_gallery import compact_recognizer, METHODS
+import argparse
+import multiprocessing
+import queue
+import threading
+import time
 import cv2
-import pyttsx3
+from speech import get_speech_service, PRIORITY_GREETING
+from frame_metrics import FrameMetrics
+from frame_source import add_source_arguments, source_from_args
+from face_workers import RecognitionPool, available_cores
+from preprocess import load_preprocessor
+from tracking import FaceTracker
+from events import open_sink
 import sys
 
 
-BASE_DIR = Path(__file__).resolve().parent
-dataset_path = BASE_DIR / "data"
-assets_path = BASE_DIR / "assets"
-
-modelFile = str(assets_path / "res10_300x300_ssd_iter_140000.caffemodel")
-configFile = str(assets_path / "deploy.prototxt")
-
-
-def distance(v1, v2):
-    return np.sqrt(((v1 - v2) ** 2).sum())
-    
-
-def knn(train, test, k=5):
-    dist = []
-    for i in range(train.shape[0]):
-        ix = train[i, :-1]
-        iy = train[i, -1]
-        d = distance(test, ix)
-        dist.append([d, iy])
-    dk = sorted(dist, key=lambda x: x[0])[:k]
-    labels = np.array(dk)[:, -1]
-    output = np.unique(labels, return_counts=True)
-    index = np.argmax(output[1])
-    return output[0][index]
-
-
-
-net = cv2.dnn.readNetFromCaffe(configFile, modelFile)
-
-
-face_data = []
-labels = []
-names = {}
-class_id = 0
-
-if not dataset_path.exists():
-    print("'data' folder not found. Please run train.py first.")
-    sys.exit()
-
-for file in dataset_path.glob("*.npy"):
-    names[class_id] = file.stem
-    print(" Loaded:", file.name)
-
-    data_item = np.load(file)
-    data_item = data_item.reshape(data_item.shape[0], -1)
-    face_data.append(data_item)
-
-    target = class_id * np.ones((data_item.shape[0],))
-    labels.append(target)
-    class_id += 1
-
-if not face_data:
-    print("No training data found in ./data/. Please collect faces first.")
-    sys.exit()
-
-face_dataset = np.concatenate(face_data, axis=0)
-face_labels = np.concatenate(labels, axis=0).reshape((-1, 1))
-trainset = np.concatenate((face_dataset, face_labels), axis=1)
-
-print("\n Training data loaded successfully!")
-print("   Face dataset shape:", face_dataset.shape)
-print("   Face labels shape:", face_labels.shape)
-
-
-engine = pyttsx3.init()
-engine.setProperty('rate', 150)
-engine.setProperty('volume', 1.0)
-spoken_names = set()
-
-
-USE_LBPH = True   # Set to False to disable LBPH
-
-if USE_LBPH:
-    print("\nInitializing LBPH recognizer (tuned parameters)...")
-    lbph = cv2.face.LBPHFaceRecognizer_create(
-        radius=1,        # Slightly larger radius for lighting robustness
-        neighbors=8,
-        grid_x=8,
-        grid_y=8,
-        threshold=70.0  # Adjust for your dataset
-    )
-    # Prepare data for LBPH training (grayscale images)
-    faces, face_ids = [], []
-    for file in dataset_path.glob("*.npy"):
-        current_id = [key for key, name in names.items() if name == file.stem][0]
-        data = np.load(file)
-        for img in data:
-            if len(img.shape) == 3:  # Color image
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            else:  # Already grayscale
-                gray = img
-
-            gray = cv2.equalizeHist(gray)
-            faces.append(gray)
-            face_ids.append(current_id)
-    if faces:
-        lbph.train(faces, np.array(face_ids))
-        print("LBPH training complete!")
-
-
-cap = cv2.VideoCapture(0)
-if not cap.isOpened():
-    print("Cannot access webcam. Try changing the camera index.")
-    sys.exit()
-
-print("\nPress 'r' to reset spoken names, 'q' to quit.\n")
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        continue
-
-    h, w = frame.shape[:2]
-    blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)),
-                                 1.0, (300, 300),
-                                 (104.0, 177.0, 123.0))
-    net.setInput(blob)
-    detections = net.forward()
-
-    for i in range(detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        if confidence > 0.6:
-            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-            x1, y1, x2, y2 = box.astype("int")
-            x1, y1 = max(0, x1), max(0, y1)
-            x2, y2 = min(w - 1, x2), min(h - 1, y2)
-
-            face_section = frame[y1:y2, x1:x2]
-            if face_section.size == 0:
-                continue
-
-            # -----------------------------
-            # Normalize face
-            # -----------------------------
-            face_section = cv2.cvtColor(face_section, cv2.COLOR_BGR2GRAY)
-            face_section = cv2.equalizeHist(face_section)
-            face_section = cv2.resize(face_section, (128, 128))
-
-            # -----------------------------
-            # Predict using LBPH or KNN
-            # -----------------------------
-            if USE_LBPH:
-                label, confidence_value = lbph.predict(face_section)
-                if label >= 0 and confidence_value < 150:
-                    pred_name = names[label]
-                else:
-                    pred_name = names.get(label, "Unknown")
-            else:
-                out = knn(trainset, face_section.flatten())
-                pred_name = names[int(out)]
-
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
-            cv2.putText(frame, f"{pred_name} ({confidence * 100:.1f}%)",
+SHOW_METRICS = False    # on-screen timing overlay, toggle with 'm'
+METRICS_LOG = BASE_DIR / "logs" / "recognise_metrics.jsonl"
+FPS_REPORT_EVERY = 5.0  # seconds between per-camera FPS lines with several cameras
+CATALOG_POLL = 5.0      # seconds between checks for enrollments and dataset edits
+
+BACKEND = "lbph"   # any of face_pipeline.BACKENDS: "lbph", "knn", "embed" (ONNX face embeddings,
+                   # see face_embedding.py), "lbp" or "lbp-hellinger" (NumPy LBP, see lbp.py)
+
+
+def handle_faces(frame, source_name, tracker, faces, tracks, lost, timestamp):
+    """Vote, report, draw and greet the (box, confidence, name, distance) results of one frame.
+
+    name is None for faces on committed tracks, which were not recognised again.
+    """
+    for (x1, y1, x2, y2, confidence, pred_name, match_distance), track in zip(faces, tracks):
+        identified = False
+        if pred_name is not None:
+            track.score = match_distance
+            weight = confidence * recognizer.confidence(pred_name, match_distance)
+            identified = tracker.vote(track, pred_name, weight)
+        name = track.name or "Unknown"
+
+        if events is not None:
+            events.emit({
+                "type": "identified" if identified else "face",
+                "time": timestamp,
+                "source": source_name,
+                "track": track.id,
+                "name": name,
+                "committed": track.committed,
+                "confidence": round(confidence, 4),
+                "distance": None if track.score is None else round(float(track.score), 3),
+                "bbox": [int(x1), int(y1), int(x2), int(y2)],
+            })
+
+        if not args.headless:
+            # Yellow once the name is settled, grey while still voting
+            colour = (0, 255, 255) if track.committed else (160, 160, 160)
+            label = name if track.committed else f"{name}?"
+            cv2.rectangle(frame, (x1, y1), (x2, y2), colour, 2)
+            cv2.putText(frame, f"{label} ({confidence * 100:.1f}%)",
                         (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX,
                         0.8, (255, 0, 0), 2)
 
-            if pred_name not in spoken_names and pred_name != "Unknown":
-                engine.say(f"Hi {pred_name}. Welcome to Utpal Shanghvi Global School!")
-                engine.runAndWait()
-                spoken_names.add(pred_name)
+        if identified and speech and name not in spoken_names:
+            speech.say(f"Hi {name}. Welcome to Utpal Shanghvi Global School!",
+                       priority=PRIORITY_GREETING)
+            spoken_names.add(name)
+
+    if events is not None:
+        for track in lost:
+            events.emit({"type": "lost", "time": timestamp, "source": source_name,
+                         "track": track.id, "name": track.name})
+
 
-    cv2.imshow("Face Recognition", frame)
+def show(window, frame, metrics):
+    """Display a frame and handle keys; returns False when the user quits."""
+    global SHOW_METRICS
+    if SHOW_METRICS:
+        metrics.draw_overlay(frame)
+    cv2.imshow(window, frame)
     key = cv2.waitKey(1) & 0xFF
 
     if key == ord('r'):
         spoken_names.clear()
         print(" Reset spoken names.")
+    elif key == ord('m'):
+        SHOW_METRICS = not SHOW_METRICS
     elif key == ord('q'):
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+        return False
+    return True
+
+
+def refresh_recognizer():
+    """Follow enrollments, renames and deletions made while running."""
+    global recognizer
+    changes = catalog.changes_since(recognizer.version)
+    if not changes:
+        return
+    summary = ", ".join(f"{action} {name}" for _, name, action, _ in changes)
+    if recognizer.apply_changes(changes, dataset_path):
+        if any(action == "add" for _, _, action, _ in changes):
+            recognizer.set_calibration(load_calibration(recognizer, dataset_path), args.far)
+    else:
+        rebuilt = load_recognizer(dataset_path, backend=args.backend, far=args.far, verbose=False,
+                                  prototypes=recognizer.prototypes)
+        if rebuilt is None:
+            print(" Gallery is now empty; keeping the faces already loaded.")
+            recognizer.version = changes[-1][0]
+            return
+        recognizer = rebuilt
+    print(f" Gallery updated: {summary}")
+
+
+def run_single(cap):
+    # Detection and recognition inline, in this process
+    net = load_detector()
+    metrics = FrameMetrics(source=cap.name, log_path=METRICS_LOG)
+    tracker = FaceTracker()
+    last_refresh = time.perf_counter()
+    try:
+        while True:
+            if time.perf_counter() - last_refresh >= CATALOG_POLL:
+                last_refresh = time.perf_counter()
+                refresh_recognizer()
+
+            ret, frame = cap.read()
+            if not ret:
+                if cap.finished:
+                    break
+                metrics.drop()
+                continue
+            timestamp = time.time()
+
+            with metrics.stage("detect"):
+                boxes = detect_faces(net, frame)
+            tracks, lost = tracker.update(boxes)
+
+            faces = []
+            pending = []        # (index in faces, prepared face)
+            for (x1, y1, x2, y2, confidence), track in zip(boxes, tracks):
+                faces.append((x1, y1, x2, y2, confidence, None, None))
+                if track.committed:
+                    # Identity settled on earlier frames, no need to recognise again
+                    continue
+
+                # -----------------------------
+                # Normalize face
+                # -----------------------------
+                with metrics.stage("preprocess"):
+                    # prepare() reuses its buffer; keep a copy for the batch
+                    pending.append((len(faces) - 1, recognizer.prepare(frame[y1:y2, x1:x2], preprocess).copy()))
 
+            # -----------------------------
+            # Predict all faces of the frame at once
+            # -----------------------------
+            if pending:
+                with metrics.stage("recognize"):
+                    results = recognizer.identify_batch([face for _, face in pending])
+                for (i, _), (pred_name, match_distance) in zip(pending, results):
+                    faces[i] = faces[i][:5] + (pred_name, match_distance)
+
+            handle_faces(frame, cap.name, tracker, faces, tracks, lost, timestamp)
+            metrics.frame_done()
+            if not args.headless and not show("Face Recognition", frame, metrics):
+                break
+    except KeyboardInterrupt:
+        pass
+    metrics.write_summary()
+    cap.release()
+
+
+def run_multi(caps, pool):
+    # One capture thread per camera feeds the process pool; this thread only
+    # collects results, so a slow camera never holds up the others.
+    results = queue.Queue()
+    stop = threading.Event()
+    metrics = [FrameMetrics(source=cap.name, log_path=METRICS_LOG) for cap in caps]
+    trackers = [FaceTracker() for _ in caps]
+    finished = [False] * len(caps)
+
+    def capture(i, cap):
+        while not stop.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                if cap.finished:
+                    break
+                metrics[i].drop()
+                continue
+            timestamp = time.time()
+            callback = lambda faces, timings, f=frame, t=timestamp: results.put((i, f, t, faces, timings))
+            if not pool.submit(cap.name, frame, callback, skip=trackers[i].committed_boxes()):
+                metrics[i].skip()       # every slot busy: drop rather than queue
+        finished[i] = True
+
+    threads = [threading.Thread(target=capture, args=(i, cap), name=f"capture-{i}", daemon=True)
+               for i, cap in enumerate(caps)]
+    for t in threads:
+        t.start()
+
+    last_report = time.perf_counter()
+    try:
+        while not (all(finished) and not pool.pending() and results.empty()):
+            try:
+                i, frame, timestamp, faces, timings = results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            for name, seconds in timings.items():
+                metrics[i].add(name, seconds)
+            tracks, lost = trackers[i].update(faces)
+            handle_faces(frame, caps[i].name, trackers[i], faces, tracks, lost, timestamp)
+            metrics[i].frame_done()
+            if not args.headless and not show(f"Face Recognition - {caps[i].name}", frame, metrics[i]):
+                break
+
+            if time.perf_counter() - last_report >= FPS_REPORT_EVERY:
+                last_report = time.perf_counter()
+                print(" | ".join(f"{cap.name}: {m.fps():.1f} FPS, {m.skipped} dropped"
+                                 for cap, m in zip(caps, metrics)))
+    except KeyboardInterrupt:
+        pass
+
+    stop.set()
+    for t in threads:
+        t.join(timeout=2)
+    for cap, m in zip(caps, metrics):
+        print(f" {cap.name}: {m.fps():.1f} FPS over {m.frames} frames ({m.skipped} dropped)")
+        m.write_summary()
+        cap.release()
+    pool.close()
+
+
+def main():
+    # Module globals the loops above read
+    global args, events, catalog, recognizer, preprocess, speech, spoken_names
+    parser = argparse.ArgumentParser(description="Live face recognition.")
+    add_source_arguments(parser, multiple=True)
+    parser.add_argument("--workers", type=int,
+                        help="recognition processes (default: inline for one source, "
+                             f"{available_cores()} for several; 0 = inline)")
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND,
+                        help=f"recognizer (default: {BACKEND})")
+    parser.add_argument("--far", type=float, default=FAR_TARGET,
+                        help="false-accept target for unknown faces, e.g. 0.001 for stricter "
+                             f"matching (default: {FAR_TARGET})")
+    parser.add_argument("--prototypes", type=int,
+                        help="match against this many prototypes per person instead of every sample "
+                             "(see compact_gallery.py)")
+    parser.add_argument("--compaction", choices=METHODS, default="kmeans",
+                        help="how --prototypes are picked (default: kmeans)")
+    parser.add_argument("--headless", action="store_true",
+                        help="no window or drawing; stop with Ctrl+C or at the end of a file source")
+    parser.add_argument("--events", help="emit recognition events as JSON lines to 'stdout', "
+                                         "'tcp://127.0.0.1:PORT' or 'unix:///path.sock' "
+                                         "(default: stdout when headless)")
+    parser.add_argument("--quiet", action="store_true", help="don't greet recognised people")
+    args = parser.parse_args()
+    if args.workers == 0 and len(args.source) > 1:
+        parser.error("--workers 0 (inline) reads a single --source; use --workers 1 or more for several")
+
+    events_spec = args.events or ("stdout" if args.headless else None)
+    events = open_sink(events_spec) if events_spec == "stdout" else None
+    if events is not None:
+        # Keep stdout for the event stream; status messages go to stderr
+        sys.stdout = sys.stderr
+
+
+    if not dataset_path.exists():
+        print("'data' folder not found. Please run train.py first.")
+        sys.exit()
+
+    catalog = FaceCatalog(dataset_path)
+    try:
+        embedder = FaceEmbedder() if args.backend == "embed" else None
+        gallery = load_backend_gallery(dataset_path, args.backend, embedder=embedder)
+    except FileNotFoundError as e:
+        print(f"{e}\nDownload the model into assets/ or choose another --backend.")
+        sys.exit()
+    if gallery is None:
+        print("No training data found in ./data/. Please collect faces first.")
+        sys.exit()
+
+    print("\n Training data loaded successfully!")
+    print("   Face dataset shape:", gallery.faces.reshape(len(gallery), -1).shape)
+    print("   Face labels shape:", gallery.labels.reshape((-1, 1)).shape)
+
+    # Same normalization the gallery was enrolled with
+    preprocess = load_preprocessor(dataset_path)
+
+    print(f"\nInitializing {args.backend.upper()} recognizer...")
+    recognizer = FaceRecognizer(gallery, backend=args.backend, embedder=embedder)
+    recognizer.version = catalog.version()
+    if args.prototypes:
+        recognizer = compact_recognizer(recognizer, args.prototypes, args.compaction, dataset_path, args.far)
+        print(f"Matching {len(recognizer.gallery)} of {len(gallery)} samples "
+              f"({args.prototypes} {args.compaction} prototypes per person)")
+    else:
+        recognizer.set_calibration(load_calibration(recognizer, dataset_path), args.far)
+    calibration = recognizer.calibration
+    print(f"Recognizer ready! Unknown thresholds at {args.far:.1%} false accepts:")
+    for name, (threshold, frr, far) in calibration_report(calibration, recognizer.thresholds).items():
+        rejected = f", rejects {frr:.0%} of own samples" if frr is not None else ""
+        print(f"   {name}: {threshold:.3g}{rejected}")
+
+    workers = args.workers if args.workers is not None else (0 if len(args.source) == 1 else available_cores())
+    pool = None
+    if workers > 0:
+        # Start the workers before any other thread; where they fork they inherit
+        # the trained recognizer, under spawn they load their own
+        pool = RecognitionPool(recognizer, dataset_path, far=args.far, workers=workers)
+        print(f"Recognition pool: {pool.workers} worker processes for {len(args.source)} source(s)")
+
+    if events_spec not in (None, "stdout"):
+        # Socket sinks start an accept thread, so they are opened after the fork
+        events = open_sink(events_spec)
+
+    speech = None if args.quiet else get_speech_service()
+    spoken_names = set()
+
+    caps = []
+    for source in args.source:
+        cap = source_from_args(args, source)
+        if not cap.isOpened():
+            print(f"Cannot open {cap.name}. Try a different --source.")
+            sys.exit()
+        caps.append(cap)
+
+    if args.headless:
+        print("\nRunning headless, press Ctrl+C to stop.\n")
+    else:
+        print("\nPress 'r' to reset spoken names, 'm' to toggle metrics, 'q' to quit.\n")
+
+    if pool is None:
+        run_single(caps[0])
+    else:
+        run_multi(caps, pool)
+
+    catalog.close()
+    if events is not None:
+        events.close()
+    if not args.headless:
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    # spawn workers (Windows, macOS, the PyInstaller build) import this module again
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,208 @@
+import hashlib
+import itertools
+import queue
+import threading
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+import pyttsx3
+
+from tracing import tracer
+
+# Lower value is spoken first
+PRIORITY_ANSWER = 0
+PRIORITY_GREETING = 1
+SPEECH_RATE = 145           # words per minute, for every caller
+
+
+class Utterance:
+    def __init__(self, text, priority):
+        self.text = text
+        self.priority = priority
+        self.cancelled = False
+        self.done = threading.Event()
+        self.trace_id = tracer.current_trace()
+        self.queued_at = time.perf_counter()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class SpeechService:
+    """Owns the only pyttsx3 engine and speaks queued utterances on one thread.
+
+    pyttsx3 engines are slow to create and not safe to drive from several
+    threads, so every caller goes through say(). Answers jump ahead of
+    greetings, and a new answer drops the answers still waiting in the queue.
+    Text spoken at least `cache_after` times is rendered to a WAV file in
+    `cache_dir` and played back directly afterwards.
+    """
+
+    def __init__(self, rate=SPEECH_RATE, volume=1.0, cache_dir=None, cache_after=3):
+        self.rate = rate
+        self.volume = volume
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.cache_after = cache_after
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._current = None
+        self._hits = {}
+        self._engine = None
+        self._thread = threading.Thread(target=self._run, name="speech", daemon=True)
+        self._thread.start()
+
+    def say(self, text, priority=PRIORITY_ANSWER, replace=None):
+        # Answers replace stale answers by default; greetings queue up
+        if replace is None:
+            replace = priority == PRIORITY_ANSWER
+        utterance = Utterance(text, priority)
+        with self._pending_lock:
+            if replace:
+                for old in self._pending:
+                    if old.priority == priority:
+                        old.cancel()
+            self._pending = [u for u in self._pending if not u.cancelled]
+            self._pending.append(utterance)
+        self._queue.put((priority, next(self._seq), utterance))
+        return utterance
+
+    def cancel(self, priority=None, current=True):
+        with self._pending_lock:
+            for u in self._pending:
+                if priority is None or u.priority == priority:
+                    u.cancel()
+            self._pending = []
+        active = self._current
+        if current and active is not None and (priority is None or active.priority == priority):
+            active.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        self._queue.put((-1, next(self._seq), None))
+        self._thread.join(timeout=2)
+
+    # ---------- worker thread ----------
+    def _run(self):
+        self._engine = pyttsx3.init()
+        self._engine.setProperty('rate', self.rate)
+        self._engine.setProperty('volume', self.volume)
+        self._engine.connect('started-word', self._on_word)
+
+        while True:
+            _, _, utterance = self._queue.get()
+            if utterance is None:
+                break
+            with self._pending_lock:
+                if utterance in self._pending:
+                    self._pending.remove(utterance)
+            if utterance.cancelled:
+                utterance.done.set()
+                continue
+
+            self._current = utterance
+            tracer.record("tts.queue", utterance.queued_at, time.perf_counter(), trace_id=utterance.trace_id)
+            try:
+                with tracer.use_trace(utterance.trace_id), tracer.span("tts.speak", chars=len(utterance.text)):
+                    self._speak(utterance)
+            except Exception as e:
+                print(f"Speech error: {e}")
+            finally:
+                self._current = None
+                utterance.done.set()
+
+            if self._queue.empty():
+                self._fill_cache()
+
+        self._engine.stop()
+
+    def _on_word(self, name, location, length):
+        if self._current is not None and self._current.cancelled:
+            self._engine.stop()
+
+    def _speak(self, utterance):
+        text = utterance.text
+        self._hits[text] = self._hits.get(text, 0) + 1
+        path = self._cache_path(text)
+        if path is not None and path.exists() and self._play_wav(path, utterance):
+            return
+        self._engine.say(text)
+        self._engine.runAndWait()
+
+    # ---------- audio cache ----------
+    def _cache_path(self, text):
+        if not self.cache_dir:
+            return None
+        key = hashlib.sha1(f"{self.rate}|{self.volume}|{text}".encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.wav"
+
+    def _fill_cache(self):
+        if not self.cache_dir:
+            return
+        for text, hits in list(self._hits.items()):
+            path = self._cache_path(text)
+            if hits >= self.cache_after and not path.exists():
+                self._engine.save_to_file(text, str(path))
+                self._engine.runAndWait()
+                return  # one file per idle moment
+
+    def _play_wav(self, path, utterance):
+        import sounddevice as sd
+        try:
+            with wave.open(str(path), 'rb') as wf:
+                rate = wf.getframerate()
+                channels = wf.getnchannels()
+                frames = wf.readframes(wf.getnframes())
+                width = wf.getsampwidth()
+        except (wave.Error, EOFError, OSError):
+            # Some pyttsx3 drivers don't write plain WAV; stop trusting this file
+            path.unlink(missing_ok=True)
+            return False
+        if width != 2 or not frames:
+            path.unlink(missing_ok=True)
+            return False
+
+        audio = np.frombuffer(frames, dtype=np.int16).reshape(-1, channels)
+        sd.play(audio, rate)
+        end = time.monotonic() + len(audio) / rate
+        while time.monotonic() < end:
+            if utterance.cancelled:
+                sd.stop()
+                break
+            time.sleep(0.05)
+        sd.wait()
+        return True
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_speech_service(**kwargs):
+    """The shared SpeechService, created with `kwargs` on first use.
+
+    Later callers get the same engine, so settings they pass must match the
+    ones it was created with.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = SpeechService(**kwargs)
+            return _service
+    settings = {"rate": _service.rate, "volume": _service.volume,
+                "cache_dir": _service.cache_dir, "cache_after": _service.cache_after}
+    if kwargs.get("cache_dir") is not None:
+        kwargs["cache_dir"] = Path(kwargs["cache_dir"])
+    conflicts = {k: v for k, v in kwargs.items() if settings.get(k, v) != v}
+    if conflicts:
+        raise ValueError(f"Speech service already running with {settings}, not {conflicts}")
+    return _service
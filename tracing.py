@@ -0,0 +1,151 @@
+import contextvars
+import itertools
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf"))
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_trace_ids = itertools.count(1)
+
+
+class Histogram:
+    def __init__(self, keep=512):
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent = deque(maxlen=keep)    # raw samples for percentiles
+
+    def add(self, ms):
+        self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.recent.append(ms)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        return float(np.percentile(np.fromiter(self.recent, dtype=np.float64), q))
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": self.max_ms,
+            "buckets": dict(zip((str(b) for b in BUCKETS_MS), self.buckets)),
+        }
+
+
+class Tracer:
+    """Collects timed spans into per-name histograms and a ring of raw records.
+
+    Spans are cheap enough to leave on permanently. Records carry the trace id
+    of the request they belong to, so one voice query can be followed from
+    the microphone to the speaker in the JSON lines output.
+    """
+
+    def __init__(self, keep_records=5000):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=keep_records)
+        self._histograms = {}
+        self._sink = None
+        self._origin = time.perf_counter()
+        self._origin_wall = time.time()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), **attrs)
+
+    def record(self, name, start, end, trace_id=None, **attrs):
+        ms = (end - start) * 1000
+        rec = {
+            "name": name,
+            "trace": trace_id if trace_id is not None else _trace_id.get(),
+            "ts": self._origin_wall + (start - self._origin),
+            "ms": round(ms, 3),
+            "thread": threading.current_thread().name,
+        }
+        if attrs:
+            rec.update(attrs)
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.add(ms)
+            self._records.append(rec)
+            if self._sink is not None:
+                self._sink.write(json.dumps(rec) + "\n")
+                self._sink.flush()
+
+    # ---------- traces ----------
+    @contextmanager
+    def trace(self, name, **attrs):
+        token = _trace_id.set(next(_trace_ids))
+        try:
+            with self.span(name, **attrs):
+                yield _trace_id.get()
+        finally:
+            _trace_id.reset(token)
+
+    def current_trace(self):
+        return _trace_id.get()
+
+    @contextmanager
+    def use_trace(self, trace_id):
+        # Carry a trace into another thread (e.g. the speech worker)
+        token = _trace_id.set(trace_id)
+        try:
+            yield
+        finally:
+            _trace_id.reset(token)
+
+    # ---------- output ----------
+    def summary(self):
+        with self._lock:
+            return {name: hist.summary() for name, hist in sorted(self._histograms.items())}
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def dump_jsonl(self, path):
+        records = self.records()
+        with open(path, "w", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec) + "\n")
+        return len(records)
+
+    def stream_to(self, path):
+        """Append every span to `path` as it finishes; None stops streaming."""
+        with self._lock:
+            if self._sink is not None:
+                self._sink.close()
+            self._sink = open(path, "a", encoding="utf-8") if path else None
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+            self._histograms.clear()
+
+
+tracer = Tracer()
+span = tracer.span
@@ -0,0 +1,105 @@
+from collections import deque
+import itertools
+
+IOU_THRESHOLD = 0.3
+VOTE_WINDOW = 10        # recent predictions kept per track
+MIN_VOTES = 5           # predictions needed before a name can be committed
+VOTE_SHARE = 0.7        # weighted share of the window the leading name needs
+
+
+def iou(a, b):
+    ax1, ay1, ax2, ay2 = a[:4]
+    bx1, by1, bx2, by2 = b[:4]
+    ix1, iy1 = max(ax1, bx1), max(ay1, by1)
+    ix2, iy2 = min(ax2, bx2), min(ay2, by2)
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    union = (ax2 - ax1) * (ay2 - ay1) + (bx2 - bx1) * (by2 - by1) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    def __init__(self, track_id, box, window=VOTE_WINDOW):
+        self.id = track_id
+        self.box = box
+        self.hits = 1
+        self.missed = 0
+        self.name = None        # leading vote, final once committed
+        self.score = None
+        self.votes = deque(maxlen=window)
+        self.committed = False
+
+
+class FaceTracker:
+    """Greedy IoU tracker that gives each face a stable id across frames.
+
+    A track survives `max_missed` frames without a matching detection, which
+    covers short detector drop-outs without merging different people.
+
+    Per-frame predictions are voted on per track: a name is committed once
+    it holds `vote_share` of the confidence-weighted window, and a committed
+    track keeps its name until it is lost.
+    """
+
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_missed=10,
+                 vote_window=VOTE_WINDOW, min_votes=MIN_VOTES, vote_share=VOTE_SHARE):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.vote_window = vote_window
+        self.min_votes = min_votes
+        self.vote_share = vote_share
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes):
+        """Match this frame's boxes; returns (tracks aligned with boxes, tracks that were lost)."""
+        pairs = sorted(((iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks)
+                        for bi, b in enumerate(boxes)), reverse=True)
+        assigned = [None] * len(boxes)
+        used = set()
+        for overlap, ti, bi in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if ti in used or assigned[bi] is not None:
+                continue
+            track = self.tracks[ti]
+            track.box = boxes[bi]
+            track.hits += 1
+            track.missed = 0
+            assigned[bi] = track
+            used.add(ti)
+
+        lost = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in used:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    lost.append(track)
+        self.tracks = [t for t in self.tracks if t not in lost]
+
+        for bi, box in enumerate(boxes):
+            if assigned[bi] is None:
+                track = Track(next(self._ids), box, self.vote_window)
+                self.tracks.append(track)
+                assigned[bi] = track
+        return assigned, lost
+
+    def vote(self, track, name, weight):
+        """Add one prediction to the track; returns True when it commits the name."""
+        if track.committed:
+            return False
+        track.votes.append((name, weight))
+        totals = {}
+        for voted, w in track.votes:
+            totals[voted] = totals.get(voted, 0.0) + w
+        leader, score = max(totals.items(), key=lambda item: item[1])
+        track.name = leader
+        # "Unknown" is never committed, so a stranger keeps being checked
+        if (leader != "Unknown" and len(track.votes) >= self.min_votes
+                and score >= self.vote_share * sum(totals.values())):
+            track.committed = True
+        return track.committed
+
+    def committed_boxes(self):
+        return [t.box for t in self.tracks if t.committed]
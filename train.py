@@ -1,8 +1,15 @@
 
 from pathlib import Path
+import argparse
 import cv2
 import numpy as np
 import sys
+from frame_metrics import FrameMetrics
+from frame_source import add_source_arguments, source_from_args
+from face_pipeline import load_recognizer
+from face_catalog import FaceCatalog
+from preprocess import FACE_SIZE, gallery_preprocessor
+from face_embedding import EMBED_MODEL, FaceEmbedder, save_embeddings
 
 # Handle PyInstaller environment
 if hasattr(sys, '_MEIPASS'):
@@ -15,9 +22,22 @@ assets_path = BASE_DIR / "assets"
 
 dataset_path.mkdir(exist_ok=True)
 
+SHOW_METRICS = False    # on-screen timing overlay, toggle with 'm'
+METRICS_LOG = BASE_DIR / "logs" / "train_metrics.jsonl"
+MAX_SAMPLES = 200
+
 # Get name argument
-if len(sys.argv) > 1:
-    person_name = sys.argv[1].strip()
+parser = argparse.ArgumentParser(description="Capture face samples for one person.")
+parser.add_argument("name", nargs="?", help="name of the person being registered")
+add_source_arguments(parser)
+parser.add_argument("--clahe", action="store_true",
+                    help="CLAHE instead of global histogram equalization (first enrollment only)")
+parser.add_argument("--align", action="store_true",
+                    help="rotate faces so the eyes are level (first enrollment only)")
+args = parser.parse_args()
+
+if args.name and args.name.strip():
+    person_name = args.name.strip()
     print(f"Capturing faces for {person_name}...")
 else:
     print(" No name provided. Please run from the GUI or provide a name argument.")
@@ -28,31 +48,51 @@ modelFile = str(assets_path / "res10_300x300_ssd_iter_140000.caffemodel")
 configFile = str(assets_path / "deploy.prototxt")
 net = cv2.dnn.readNetFromCaffe(configFile, modelFile)
 
-cap = cv2.VideoCapture(0)
-face_data = []
+preprocess = gallery_preprocessor(dataset_path, clahe=args.clahe, align=args.align)
+
+# Colour embeddings for the "embed" recognizer, when its model is installed
+embedder = FaceEmbedder() if EMBED_MODEL.exists() else None
+embeddings = []
+
+cap = source_from_args(args)
+if not cap.isOpened():
+    print(f"Cannot open {cap.name}. Try a different --source.")
+    sys.exit()
+face_data = np.empty((MAX_SAMPLES,) + FACE_SIZE, dtype=np.uint8)
 count = 0
 frame_count = 0
+metrics = FrameMetrics(source=cap.name, log_path=METRICS_LOG)
 
 while True:
     ret, frame = cap.read()
     if not ret:
+        if cap.finished:
+            break
+        metrics.drop()
         continue
 
     frame_count += 1
 
     # Process every 5th frame for speed
     if frame_count % 5 != 0:
+        metrics.skip()
+        if SHOW_METRICS:
+            metrics.draw_overlay(frame)
         cv2.imshow("Face Capture", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('m'):
+            SHOW_METRICS = not SHOW_METRICS
+        elif key == ord('q'):
             break
         continue
 
     # Resize for faster detection
-    small_frame = cv2.resize(frame, (320, 240))
-    h, w = small_frame.shape[:2]
-    blob = cv2.dnn.blobFromImage(small_frame, 1.0, (300, 300), (104.0, 177.0, 123.0))
-    net.setInput(blob)
-    detections = net.forward()
+    with metrics.stage("detect"):
+        small_frame = cv2.resize(frame, (320, 240))
+        h, w = small_frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(small_frame, 1.0, (300, 300), (104.0, 177.0, 123.0))
+        net.setInput(blob)
+        detections = net.forward()
 
     for i in range(detections.shape[2]):
         confidence = detections[0, 0, i, 2]
@@ -71,31 +111,45 @@ while True:
             y2 = int(y2 * scale_y)
 
             face_section = frame[y1:y2, x1:x2]
-            if face_section.size == 0:
+            if face_section.size == 0 or count >= MAX_SAMPLES:
                 continue
 
-
-            face_section = cv2.cvtColor(face_section, cv2.COLOR_BGR2GRAY)
-            face_section = cv2.equalizeHist(face_section)
-            face_section = cv2.resize(face_section, (128, 128))
-
-
-            face_data.append(face_section)
+            with metrics.stage("preprocess"):
+                preprocess(face_section, out=face_data[count])
+            if embedder is not None:
+                with metrics.stage("embed"):
+                    embeddings.append(embedder.embed([face_section])[0])
             count += 1
 
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
             cv2.putText(frame, f"Count: {count}", (10, 30),
                         cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
 
+    metrics.frame_done()
+    if SHOW_METRICS:
+        metrics.draw_overlay(frame)
     cv2.imshow("Face Capture", frame)
     key = cv2.waitKey(1) & 0xFF
-    if key == ord('q') or count >= 200:
+    if key == ord('m'):
+        SHOW_METRICS = not SHOW_METRICS
+    if key == ord('q') or count >= MAX_SAMPLES:
         break
 
 # Save face data
-face_data = np.array(face_data)
+face_data = face_data[:count]
 np.save(dataset_path / f"{person_name}.npy", face_data)
 print(f"Saved {face_data.shape} for {person_name} in {dataset_path}")
+if embeddings:
+    save_embeddings(dataset_path, person_name, np.array(embeddings))
+
+with FaceCatalog(dataset_path, sync=False) as catalog:
+    catalog.record(person_name)
+
+if len(face_data):
+    # Per-person unknown thresholds are refreshed with every enrollment
+    print("Calibrating unknown-face thresholds...")
+    load_recognizer(dataset_path, verbose=False)
 
+metrics.write_summary()
 cap.release()
 cv2.destroyAllWindows()